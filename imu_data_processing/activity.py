@@ -0,0 +1,217 @@
+from typing import NamedTuple, Optional, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+# Activity metrics computed from the (x, y, z) acceleration in g:
+#     -  mean:      signed mean of x, y and z (the original definition, kept for compatibility)
+#     -  abs_mean:  absolute value of the mean
+#     -  magnitude: vector magnitude minus gravity, sqrt(x^2 + y^2 + z^2) - 1
+#     -  enmo:      Euclidean norm minus one, with negative values set to zero
+#     -  highpass:  magnitude with its moving average removed (absolute value), which
+#                   also cancels sensor offsets and slow orientation changes
+METRICS = ('mean', 'abs_mean', 'magnitude', 'enmo', 'highpass')
+
+DEFAULT_METRIC = 'mean'
+
+# Metrics computed in float64 rather than float32
+FLOAT64_METRICS = ('mean', 'abs_mean')
+
+# Number of samples in the moving average removed by the 'highpass' metric
+HIGHPASS_WINDOW = 64
+
+# Rolling-window statistics the activity can be smoothed with before thresholding:
+#     -  mean: average over the window (spreads single spikes out)
+#     -  std: standard deviation over the window (how much the signal moves)
+#     -  min: lowest value, so the activity must stay above the threshold for the whole window
+#     -  max: highest value
+SMOOTHING_STATISTICS = ('mean', 'std', 'min', 'max')
+
+
+class Smoothing(NamedTuple):
+    """
+    Rolling-window smoothing, written 'statistic:window' with the window in samples or,
+    with an 's' suffix, in seconds (e.g. 'min:3' or 'mean:1.5s'). Windows are centered
+    on each sample and shrink at the ends of the data.
+    """
+    statistic: str
+    window: float
+    seconds: bool
+
+    def __str__(self) -> str:
+        return f"{self.statistic}:{self.window:g}{'s' if self.seconds else ''}"
+
+
+def parse_smoothing(spec) -> Optional[Smoothing]:
+    """
+    Parse a smoothing such as 'min:3' or 'mean:1.5s'. None, '' and 'none' mean no smoothing.
+    """
+    if isinstance(spec, Smoothing):
+        return spec
+    if spec is None or spec.strip().lower() in ('', 'none'):
+        return None
+
+    statistic, _, window = spec.strip().partition(':')
+    seconds = window.endswith('s')
+    try:
+        size = float(window[:-1] if seconds else window)
+    except ValueError:
+        size = 0.0
+    if statistic not in SMOOTHING_STATISTICS or size <= 0 or (not seconds and size != int(size)):
+        raise ValueError(f"Invalid smoothing {spec!r}: expected statistic:window with statistic one of "
+                         f"{', '.join(SMOOTHING_STATISTICS)} and a window in samples (e.g. 'min:3') "
+                         f"or seconds (e.g. 'mean:1.5s')")
+    return Smoothing(statistic, size, seconds)
+
+
+def compute_activity(xyz: NDArray, metric: str = DEFAULT_METRIC,
+                     highpass_window: int = HIGHPASS_WINDOW) -> NDArray:
+    """
+    Compute a per-sample activity signal from an (n, 3) array of x, y, z accelerations.
+    The result is computed in place in a single float32 buffer, except for 'mean' and
+    'abs_mean', which stay float64 so thresholds give exactly the same results as before.
+    """
+    if metric not in METRICS:
+        raise ValueError(f"Unknown activity metric {metric!r}, expected one of {', '.join(METRICS)}")
+
+    x, y, z = xyz[:, 0], xyz[:, 1], xyz[:, 2]
+
+    if metric in FLOAT64_METRICS:
+        out = xyz.mean(axis=1, dtype=np.float64)
+        if metric == 'abs_mean':
+            np.abs(out, out=out)
+        return out
+
+    # Sum of squares accumulated in one output buffer and one scratch buffer
+    out = np.empty(len(xyz), dtype=np.float32)
+    scratch = np.empty(len(xyz), dtype=np.float32)
+    np.multiply(x, x, out=out, casting='same_kind')
+    np.multiply(y, y, out=scratch, casting='same_kind')
+    out += scratch
+    np.multiply(z, z, out=scratch, casting='same_kind')
+    out += scratch
+    np.sqrt(out, out=out)
+
+    if metric == 'highpass':
+        out -= moving_average(out, highpass_window, out=scratch)
+        np.abs(out, out=out)
+        return out
+
+    # Remove gravity (1 g)
+    out -= 1.0
+    if metric == 'enmo':
+        np.maximum(out, 0.0, out=out)
+    return out
+
+
+def moving_average(values: NDArray, window: int, out: Optional[NDArray] = None) -> NDArray:
+    """
+    Centered moving average over `window` samples (shrinking at the edges), computed
+    from a cumulative sum in O(n).
+    """
+    return rolling_mean(values, sample_window(len(values), window), out)
+
+
+def sample_window(n: int, window: int) -> Tuple[NDArray[np.int64], NDArray[np.int64]]:
+    """
+    Bounds [first, last) of the window of `window` samples centered on each of n samples
+    (one sample more after the center than before it for even windows), clipped to the data.
+    """
+    first = np.arange(n) - (window - 1) // 2
+    return np.maximum(first, 0), np.minimum(first + window, n)
+
+
+def time_window(times: NDArray, seconds: float) -> Tuple[NDArray[np.int64], NDArray[np.int64]]:
+    """
+    Bounds [first, last) of the samples within `seconds` / 2 of each sample (sorted times).
+    """
+    return (np.searchsorted(times, times - seconds / 2, side='left'),
+            np.searchsorted(times, times + seconds / 2, side='right'))
+
+
+def rolling_mean(values: NDArray, bounds: Tuple[NDArray, NDArray], out: Optional[NDArray] = None) -> NDArray:
+    """
+    Mean of values[first:last] for every pair of bounds, from one cumulative sum: O(n).
+    """
+    first, last = bounds
+    cumsum = np.zeros(len(values) + 1, dtype=np.float64)
+    np.cumsum(values, dtype=np.float64, out=cumsum[1:])
+
+    if out is None:
+        out = np.empty(len(first), dtype=np.float64)
+    np.divide(cumsum[last] - cumsum[first], last - first, out=out, casting='same_kind')
+    return out
+
+
+def rolling_var(values: NDArray, bounds: Tuple[NDArray, NDArray]) -> NDArray[np.float64]:
+    """
+    Variance of values[first:last] for every pair of bounds, from cumulative sums of the
+    values and of their squares: O(n).
+    """
+    first, last = bounds
+
+    # Centre the values first, so the sums of squares stay small and the differences exact
+    centered = np.asarray(values, dtype=np.float64) - (np.mean(values, dtype=np.float64) if len(values) else 0.0)
+    mean = rolling_mean(centered, bounds)
+    mean_square = rolling_mean(np.square(centered), bounds)
+
+    # Rounding can leave tiny negative variances in flat stretches
+    return np.maximum(mean_square - np.square(mean), 0.0, out=mean_square)
+
+
+def rolling_max(values: NDArray, bounds: Tuple[NDArray, NDArray]) -> NDArray:
+    """
+    Maximum of values[first:last] for every pair of bounds (each window non-empty). A sparse
+    table built one level at a time: level k holds the maxima of 2^k consecutive values, and
+    answers the windows of 2^k to 2^(k+1) - 1 values as the maximum of two overlapping runs.
+    O(n log w) for windows of up to w values, with a single level in memory at a time.
+    """
+    first, last = bounds
+    out = np.empty(len(first), dtype=np.result_type(values))
+    if not len(first):
+        return out
+
+    # Level needed by each window: the largest power of two not longer than it
+    levels = np.floor(np.log2(last - first)).astype(np.int64)
+
+    level = np.asarray(values)
+    for k in range(int(levels.max()) + 1):
+        selected = np.flatnonzero(levels == k)
+        if len(selected):
+            out[selected] = np.maximum(level[first[selected]], level[last[selected] - (1 << k)])
+        if k < levels.max():
+            level = np.maximum(level[:-(1 << k)], level[(1 << k):])
+    return out
+
+
+def smooth(activity: NDArray, smoothing, times: Optional[NDArray] = None) -> NDArray:
+    """
+    Apply a Smoothing (or its 'statistic:window' spec) to a per-sample activity signal.
+    Windows in seconds need the sample `times`.
+    """
+    smoothing = parse_smoothing(smoothing)
+    if smoothing is None or not len(activity):
+        return activity
+
+    if smoothing.seconds:
+        if times is None:
+            raise ValueError(f"Smoothing {smoothing} needs the times of the samples")
+
+        # Windows in seconds are found in time order
+        if np.any(times[1:] < times[:-1]):
+            order = np.argsort(times, kind='stable')
+            in_order = smooth(activity[order], smoothing, times[order])
+            smoothed = np.empty_like(in_order)
+            smoothed[order] = in_order
+            return smoothed
+        bounds = time_window(times, smoothing.window)
+    else:
+        bounds = sample_window(len(activity), int(smoothing.window))
+
+    if smoothing.statistic == 'mean':
+        return rolling_mean(activity, bounds)
+    if smoothing.statistic == 'std':
+        return np.sqrt(rolling_var(activity, bounds))
+    if smoothing.statistic == 'min':
+        return -rolling_max(-activity, bounds)
+    return rolling_max(activity, bounds)
@@ -0,0 +1,276 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+import instrument
+from activity import DEFAULT_METRIC, METRICS, parse_smoothing
+from dataloader import PACKED_SUFFIX, Dataloader
+from pack import is_up_to_date as is_packed_up_to_date
+from processor import Processor
+from results_store import DEFAULT_STORE_PATH
+
+# Records, by absolute input path, the processing parameters and the input size and
+# modification time each output was produced with, so outputs produced with different
+# parameters or from another version of the input are never reported as up to date
+PARAMS_FILE = '.batch_params.json'
+
+SUMMARY_FILE = 'enrichment_summary.csv'
+
+
+def find_inputs(paths: List[str]) -> List[str]:
+    """
+    Expand directories (all .txt and packed files inside) and glob patterns into a sorted
+    list of data files. A .txt file with an up to date packed copy next to it is replaced by
+    the copy; a packed copy older than its .txt file is left out, as the log changed since.
+    """
+    files = set()
+    for path in paths:
+        if os.path.isdir(path):
+            files.update(f for f in glob.glob(os.path.join(path, '*'))
+                         if os.path.isfile(f) and f.lower().endswith(('.txt', PACKED_SUFFIX)))
+        else:
+            files.update(f for f in glob.glob(path) if os.path.isfile(f))
+    texts = {os.path.splitext(f)[0]: f for f in files if not f.endswith(PACKED_SUFFIX)}
+    inputs = []
+    for f in files:
+        stem = os.path.splitext(f)[0]
+        if f.endswith(PACKED_SUFFIX):
+            if stem not in texts or is_packed_up_to_date(texts[stem], f):
+                inputs.append(f)
+        elif stem + PACKED_SUFFIX not in files or not is_packed_up_to_date(f, stem + PACKED_SUFFIX):
+            inputs.append(f)
+    return sorted(inputs)
+
+
+def data_name(filename: str) -> str:
+    return os.path.splitext(os.path.basename(filename))[0]
+
+
+def output_path(output_dir: str, filename: str) -> str:
+    return os.path.join(output_dir, f'{data_name(filename)}_enrichment_data.csv')
+
+
+def check_data_names(inputs: List[str]) -> None:
+    """
+    Raise a ValueError if two inputs have the same data name (e.g. the same file name in
+    two folders), as they would be written to the same output files.
+    """
+    seen = {}
+    for filename in inputs:
+        other = seen.setdefault(data_name(filename), filename)
+        if other != filename:
+            raise ValueError(f"{other} and {filename} would both be saved as {data_name(filename)}: "
+                             "rename one or process them into different output directories")
+
+
+def params_entry(filename: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    The PARAMS_FILE entry of an input processed with the given parameters.
+    """
+    stat = os.stat(filename)
+    return {'params': params, 'size': stat.st_size, 'mtime': stat.st_mtime}
+
+
+def is_up_to_date(filename: str, output_dir: str, params: Dict[str, Any], previous_params: Dict[str, Any]) -> bool:
+    """
+    An output is up to date if it was produced from this version of its input with the same parameters.
+    """
+    return (previous_params.get(os.path.abspath(filename)) == params_entry(filename, params) and
+            os.path.exists(output_path(output_dir, filename)))
+
+
+def process_file(filename: str, output_dir: str, threshold: float,
+                 start_time: Optional[str], end_time: Optional[str], use_cache: bool,
+                 merge_gap: float = 5.0, min_duration: float = 1.0,
+                 metric: str = DEFAULT_METRIC, store: Optional[str] = None,
+                 animal: Optional[str] = None, device: str = '',
+                 smoothing: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Run read_file -> crop -> process_imu_data -> save_results (and the interaction
+    bouts) on one data file, appending the results to the results store at `store`.
+    Runs in a worker process, so it only returns plain data, including the spans the
+    worker recorded for the file when timing is on (see instrument).
+    """
+    timings = {}
+    first_span = time.perf_counter()
+
+    start = time.perf_counter()
+    dl = Dataloader.read_file(filename, use_cache=use_cache)
+    timings['read'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if start_time is not None or end_time is not None:
+        dl = dl.crop(start_time, end_time)
+    timings['crop'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    processor = Processor(dl, metric, smoothing)
+    processor.process_imu_data(threshold)
+    timings['process'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    processor.detect_bouts(threshold, merge_gap, min_duration)
+    timings['bouts'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    output = processor.save_results(output_dir, data_name(filename), store, animal, device)
+    processor.save_bouts(output_dir, data_name(filename))
+    timings['save'] = time.perf_counter() - start
+
+    spans = [record for record in instrument.spans() if record.start >= first_span]
+    return {'rows': len(dl), 'output': output, 'result': processor.results_table(), 'timings': timings,
+            'pid': os.getpid(), 'spans': spans}
+
+
+def read_results(output: str) -> np.ndarray:
+    return np.loadtxt(output, delimiter=',', skiprows=1, dtype=int, ndmin=2).reshape(-1, 6)
+
+
+def write_summary(output_dir: str, results: Dict[str, np.ndarray]) -> str:
+    """
+    Combine the per-file tables into one CSV with the data name as first column.
+    """
+    summary = os.path.join(output_dir, SUMMARY_FILE)
+    with open(summary, 'w') as f:
+        f.write('File,Year,Month,Day,Hour,Minutes of Interaction,Minutes with Data\n')
+        for filename, result in sorted(results.items()):
+            for row in result:
+                f.write(data_name(filename) + ',' + ','.join(str(int(value)) for value in row) + '\n')
+    return summary
+
+
+def run_batch(inputs: List[str], output_dir: str, threshold: float = 0.5,
+              start_time: Optional[str] = None, end_time: Optional[str] = None,
+              workers: Optional[int] = None, force: bool = False, use_cache: bool = True,
+              merge_gap: float = 5.0, min_duration: float = 1.0,
+              metric: str = DEFAULT_METRIC, store: Optional[str] = DEFAULT_STORE_PATH,
+              animal: Optional[str] = None, device: str = '', smoothing: Optional[str] = None) -> int:
+    """
+    Process every input file in a process pool and write one enrichment table per
+    file plus a combined summary. Returns the number of files that failed.
+    Raises a ValueError if two inputs would be saved to the same output files.
+    """
+    check_data_names(inputs)
+    os.makedirs(output_dir, exist_ok=True)
+
+    params = {'algorithm_version': Processor.ALGORITHM_VERSION, 'threshold': threshold, 'start_time': start_time, 'end_time': end_time,
+              'merge_gap': merge_gap, 'min_duration': min_duration, 'metric': metric,
+              'store': store, 'animal': animal, 'device': device}
+
+    # Only recorded when set, so unsmoothed outputs from before smoothing existed stay up to date
+    smoothing = parse_smoothing(smoothing)
+    if smoothing is not None:
+        smoothing = params['smoothing'] = str(smoothing)
+    params_path = os.path.join(output_dir, PARAMS_FILE)
+    try:
+        with open(params_path, 'r') as f:
+            previous_params = json.load(f)
+    except (OSError, ValueError):
+        previous_params = {}
+    # Entries keyed on output names by older versions are dropped: their inputs are reprocessed once
+    previous_params = {key: entry for key, entry in previous_params.items() if os.path.isabs(key)}
+
+    results = {}
+    failed = 0
+    to_process = []
+    entries = {}
+    for filename in inputs:
+        if not force and is_up_to_date(filename, output_dir, params, previous_params):
+            print(f"{os.path.basename(filename):40s} up to date")
+            results[filename] = read_results(output_path(output_dir, filename))
+        else:
+            to_process.append(filename)
+            # Taken before processing, so a log written to meanwhile is processed again next time
+            entries[filename] = params_entry(filename, params)
+
+    batch_start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(process_file, filename, output_dir, threshold,
+                                   start_time, end_time, use_cache, merge_gap, min_duration, metric,
+                                   store, animal, device, smoothing): filename
+                   for filename in to_process}
+
+        for future in as_completed(futures):
+            filename = futures[future]
+            try:
+                report = future.result()
+            except Exception as e:
+                failed += 1
+                print(f"{os.path.basename(filename):40s} FAILED: {e}", file=sys.stderr)
+                continue
+
+            results[filename] = report['result']
+            instrument.add_spans(report['spans'], f"worker {report['pid']}")
+            # An input of the same name processed before no longer owns the output files
+            for other in [other for other in previous_params if data_name(other) == data_name(filename)]:
+                del previous_params[other]
+            previous_params[os.path.abspath(filename)] = entries[filename]
+            timings = report['timings']
+            print(f"{os.path.basename(filename):40s} {report['rows']:9d} rows  " +
+                  "  ".join(f"{stage} {seconds:7.3f}s" for stage, seconds in timings.items()) +
+                  f"  total {sum(timings.values()):7.3f}s")
+
+    with open(params_path, 'w') as f:
+        json.dump(previous_params, f, indent=1)
+
+    summary = write_summary(output_dir, results)
+    if instrument.is_enabled():
+        print(instrument.format_summary())
+    print(f"Processed {len(to_process) - failed} file(s), skipped {len(inputs) - len(to_process)}, "
+          f"failed {failed} in {time.perf_counter() - batch_start:.2f}s. Summary: {summary}")
+    return failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Process a directory of enrichment tracker data files in parallel.")
+    parser.add_argument('inputs', nargs='+', help="Data files, directories or glob patterns")
+    parser.add_argument('-o', '--output-dir', default='OUTPUT', help="Directory for the enrichment tables")
+    parser.add_argument('-t', '--threshold', type=float, default=0.5, help="Activity threshold")
+    parser.add_argument('--start', help='Crop start time, "Y M D h m s" (excluded)')
+    parser.add_argument('--end', help='Crop end time, "Y M D h m s" (excluded)')
+    parser.add_argument('-j', '--workers', type=int, default=None, help="Number of worker processes (default: all cores)")
+    parser.add_argument('-f', '--force', action='store_true', help="Reprocess files whose outputs are up to date")
+    parser.add_argument('--merge-gap', type=float, default=5.0, help="Merge interaction bouts closer than this (seconds)")
+    parser.add_argument('--min-duration', type=float, default=1.0, help="Drop interaction bouts shorter than this (seconds)")
+    parser.add_argument('-m', '--metric', choices=METRICS, default=DEFAULT_METRIC,
+                        help="Activity metric compared against the threshold")
+    parser.add_argument('--smooth', type=parse_smoothing, default=None, metavar='STATISTIC:WINDOW',
+                        help="Smooth the activity over a rolling window before thresholding: statistic mean, std, "
+                             "min or max, window in samples or seconds with an 's' suffix (e.g. min:3 or mean:1s)")
+    parser.add_argument('--store', default=DEFAULT_STORE_PATH, help="Results store the tables are appended to")
+    parser.add_argument('--no-store', action='store_true', help="Do not append the tables to the results store")
+    parser.add_argument('--animal', help="Animal of every file (default: guessed from each file name)")
+    parser.add_argument('--device', default='', help="Tracker device of every file")
+    parser.add_argument('--no-cache', action='store_true', help="Do not use the parsed-data cache")
+    parser.add_argument('--trace', metavar='TRACE.json',
+                        help="Record the time of every stage in every worker and save them as a Chrome trace")
+    args = parser.parse_args()
+
+    # Workers turn timing on from the environment, whether they are forked or spawned
+    if args.trace and not instrument.is_enabled():
+        os.environ[instrument.ENV_VARIABLE] = '1'
+        instrument.enable()
+
+    inputs = find_inputs(args.inputs)
+    if not inputs:
+        parser.error("no data files found")
+    try:
+        check_data_names(inputs)
+    except ValueError as e:
+        parser.error(str(e))
+
+    failed = run_batch(inputs, args.output_dir, args.threshold, args.start, args.end,
+                       args.workers, args.force, not args.no_cache,
+                       args.merge_gap, args.min_duration, args.metric,
+                       None if args.no_store else args.store, args.animal, args.device,
+                       args.smooth)
+    if args.trace:
+        instrument.export_trace(args.trace)
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,419 @@
+import argparse
+import contextlib
+import datetime
+import glob
+import io
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Any, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from numpy.typing import NDArray
+
+from dataloader import PACKED_SUFFIX, Dataloader, LogLayout, from_epoch_seconds, to_epoch_seconds
+from processor import Processor
+
+# Synthetic logs, loosely modelled on the DATA logs: about 8.5 samples per second, with
+#     -  bursts: seconds in which the logger writes a backlog of several times the usual samples
+#     -  gaps: stretches in which the logger sleeps or the card is swapped
+#     -  bouts: minutes of interaction with the device among long stretches at rest
+SYNTHETIC_START = '2025 3 14 8 00 00'
+SYNTHETIC_RATE_HZ = 8.5
+BURST_PROBABILITY = 0.01
+BURST_FACTOR = 4
+GAP_PROBABILITY = 0.0005
+GAP_MEAN_SECONDS = 600
+REST_MEAN_SECONDS = 900
+BOUT_MEAN_SECONDS = 90
+
+# Number of seconds of log generated and written at a time
+GENERATE_CHUNK_SECONDS = 100_000
+
+# Largest synthetic log checked against the (slow) legacy implementations
+CHECK_LIMIT_ROWS = 200_000
+
+# Larger synthetic logs are streamed in blocks (Dataloader.iter_chunks) instead of loaded whole:
+# loading peaks at about 175 MB per million rows, so 100M rows would need 17-18 GB
+STREAM_LIMIT_ROWS = 5_000_000
+
+# Number of rows per block when streaming
+STREAM_CHUNK_ROWS = 100_000
+
+# Benchmark results of every run, to compare across commits
+DEFAULT_HISTORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_history.json')
+
+
+def legacy_read_file(filename: str) -> Tuple[List[Any], NDArray[np.float64]]:
+    """
+    Reference implementation of the original parser: read the file as a CSV
+    with a single string column and split every row in Python.
+    """
+    df = pd.read_csv(filename)
+    metadata = list(df.columns.values)
+
+    raw_data = []
+    for _, row in df.iterrows():
+        raw_data.append([float(coord) for coord in row.values[0].split()])
+
+    return metadata, np.array(raw_data)
+
+
+def legacy_process_imu_data(raw_data: NDArray[np.float64], threshold: float) -> NDArray[np.int64]:
+    """
+    Reference implementation of the original Processor.process_imu_data: per-row
+    means in Python and nested per-hour/per-minute boolean masks.
+    """
+    imu_data_avg = np.array([np.mean(row[-3:]) for row in raw_data])
+    combined_data = np.column_stack((raw_data[:, :6], imu_data_avg))
+
+    minutes_per_hour = []
+    for hour in np.unique(combined_data[:, :4], axis=0):
+        hour_data = combined_data[np.all(combined_data[:, :4] == hour, axis=1)]
+
+        minutes_above_threshold = 0
+        for minute in np.unique(hour_data[:, 4]):
+            if np.any(hour_data[hour_data[:, 4] == minute, 6] > threshold):
+                minutes_above_threshold += 1
+
+        minutes_per_hour.append(np.append(hour, minutes_above_threshold))
+
+    return np.array(minutes_per_hour).astype(int)
+
+
+def legacy_crop(raw_data: NDArray[np.float64], start_time: str, end_time: str) -> NDArray[np.float64]:
+    """
+    Reference implementation of the original Dataloader.crop: a boolean mask over every row.
+    """
+    timestamps = to_epoch_seconds(raw_data[:, :6])
+    start = Dataloader._parse_time(start_time)
+    end = Dataloader._parse_time(end_time)
+    return raw_data[(timestamps > start) & (timestamps < end)]
+
+
+def generate_log(filename: str, rows: int, seed: int = 0) -> None:
+    """
+    Write a headerless synthetic "Y M D h m s x y z" log of `rows` samples (2 decimals,
+    CRLF line endings, as written by the logger). The same seed gives the same file.
+    """
+    rng = np.random.default_rng(seed)
+    epoch = Dataloader._parse_time(SYNTHETIC_START)
+    active = False
+    written = 0
+
+    with open(filename, 'wb') as file:
+        while written < rows:
+            seconds = GENERATE_CHUNK_SECONDS
+
+            # Samples logged in every second, and the seconds skipped by gaps
+            counts = rng.poisson(SYNTHETIC_RATE_HZ, seconds)
+            counts[rng.random(seconds) < BURST_PROBABILITY] *= BURST_FACTOR
+            steps = np.ones(seconds, dtype=np.int64)
+            gaps = rng.random(seconds) < GAP_PROBABILITY
+            steps[gaps] += rng.exponential(GAP_MEAN_SECONDS, int(gaps.sum())).astype(np.int64)
+            times = epoch + np.cumsum(steps) - steps[0]
+            epoch = int(times[-1] + steps[-1])
+
+            # Alternating runs of rest and bouts of activity, continuing the state of the previous chunk
+            durations, states = [], []
+            covered = 0
+            while covered < seconds:
+                mean = BOUT_MEAN_SECONDS if active else REST_MEAN_SECONDS
+                duration = int(rng.geometric(1 / mean))
+                durations.append(duration)
+                states.append(active)
+                covered += duration
+                active = not active
+            active = states[-1]
+            second_active = np.repeat(states, durations)[:seconds]
+
+            # Samples of each second: the device at rest reads gravity plus noise, a bout shakes it
+            second = np.repeat(np.arange(seconds), counts)[:rows - written]
+            sample_active = second_active[second]
+            xyz = np.array([0.5, 0.0, 0.85]) + rng.normal(0.0, 0.05, (len(second), 3))
+            xyz[sample_active] += rng.normal(0.0, 0.6, (int(sample_active.sum()), 3))
+            xyz = np.round(xyz, 2) + 0.0
+
+            np.savetxt(file, np.column_stack((from_epoch_seconds(times[second]), xyz)),
+                       fmt=['%d'] * 6 + ['%.2f'] * 3, delimiter=' ', newline='\r\n')
+            written += len(second)
+
+
+def parse_size(size: str) -> int:
+    """
+    Parse a number of rows such as 10000, 10k or 100M.
+    """
+    multipliers = {'k': 10 ** 3, 'm': 10 ** 6, 'g': 10 ** 9}
+    if size and size[-1].lower() in multipliers:
+        return int(float(size[:-1]) * multipliers[size[-1].lower()])
+    return int(size)
+
+
+def time_call(fn: Callable[[], Any], repeat: int) -> Tuple[float, Any]:
+    """
+    Run fn `repeat` times and return the best wall-clock time with the last result.
+    """
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def peak_memory(fn: Callable[[], Any]) -> int:
+    """
+    Peak memory (bytes) allocated through Python and NumPy while running fn once.
+    Run separately from the timed calls, since tracing slows allocations down.
+    """
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def matches_legacy(dl: Dataloader, legacy_raw: NDArray[np.float64], layout: LogLayout) -> bool:
+    """
+    Check that every sample the legacy parser kept is reproduced by the Dataloader, in order.
+    The legacy parser treated the first line as a header (losing the first sample
+    of headerless files) and returned only the fields present in the file. Rows the
+    Dataloader recovers around NUL bytes, that the legacy parser dropped, are not compared
+    (see recovered_rows).
+    """
+    values = dl.raw_data[:, -legacy_raw.shape[1]:] if legacy_raw.ndim == 2 else dl.raw_data
+    if not layout.header:
+        values = values[1:]
+    if values.ndim != legacy_raw.ndim or values.shape[1:] != legacy_raw.shape[1:]:
+        return False
+
+    # Drop the first differing row until both tables have the same length
+    while len(values) > len(legacy_raw):
+        differs = (values[:len(legacy_raw)] != legacy_raw).reshape(len(legacy_raw), -1).any(axis=1)
+        first = int(np.argmax(differs)) if differs.any() else len(legacy_raw)
+        values = np.delete(values, first, axis=0)
+    return values.shape == legacy_raw.shape and np.array_equal(values, legacy_raw)
+
+
+def recovered_rows(dl: Dataloader, legacy_raw: NDArray[np.float64], layout: LogLayout) -> int:
+    """
+    Number of samples the Dataloader kept beyond those of the legacy parser, e.g. the
+    records recovered around NUL bytes that the legacy parser dropped with their line.
+    """
+    return len(dl) - (0 if layout.header else 1) - len(legacy_raw)
+
+
+def bench_read_file(filenames: List[str], repeat: int = 3) -> None:
+    """
+    Compare Dataloader.read_file against the legacy row-by-row parser.
+    """
+    print(f"{'file':40s} {'layout':>12s} {'rows':>8s} {'legacy rows':>12s} {'legacy (s)':>11s} {'bulk (s)':>9s} {'speedup':>8s}  matches")
+    for filename in filenames:
+        legacy_time, (_, legacy_raw) = time_call(lambda: legacy_read_file(filename), repeat)
+        bulk_time, dl = time_call(lambda: Dataloader.read_file(filename, use_cache=False), repeat)
+        layout = Dataloader.sniff_layout(filename)
+
+        # Samples only the Dataloader kept are listed next to the result of the comparison
+        recovered = recovered_rows(dl, legacy_raw, layout)
+        note = f" (+{recovered} recovered rows not in legacy)" if recovered > 0 else ''
+        print(f"{os.path.basename(filename):40s} {layout.name:>12s} {len(dl):8d} {len(legacy_raw):12d} {legacy_time:11.4f} "
+              f"{bulk_time:9.4f} {legacy_time / bulk_time:7.1f}x  {matches_legacy(dl, legacy_raw, layout)}{note}")
+
+
+def bench_process(filenames: List[str], threshold: float = 0.5, repeat: int = 3) -> None:
+    """
+    Compare Processor.process_imu_data against the legacy per-row implementation.
+    """
+    print(f"{'file':40s} {'rows':>8s} {'legacy (s)':>11s} {'vector (s)':>11s} {'speedup':>8s}  identical")
+    for filename in filenames:
+        dl = Dataloader.read_file(filename, use_cache=False)
+        if not dl.has_timestamps:
+            continue
+
+        legacy_time, legacy_result = time_call(lambda: legacy_process_imu_data(dl.raw_data, threshold), repeat)
+        vector_time, result = time_call(lambda: Processor(dl).process_imu_data(threshold), repeat)
+
+        print(f"{os.path.basename(filename):40s} {len(dl):8d} {legacy_time:11.4f} "
+              f"{vector_time:11.4f} {legacy_time / vector_time:7.1f}x  {np.array_equal(result, legacy_result)}")
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_streamed(filename: str, threshold: float, repeat: int, workdir: str, data_name: str
+                   ) -> Tuple[int, Dict[str, Dict[str, float]]]:
+    """
+    Time and measure the peak memory of aggregating a log streamed in blocks with
+    Processor.process_imu_data_chunks, and of saving the result, with memory bounded
+    by the block size. Returns the number of rows and the results per stage.
+    """
+    def aggregate() -> Processor:
+        processor = Processor()
+        processor.process_imu_data_chunks(Dataloader.iter_chunks(filename, STREAM_CHUNK_ROWS), threshold)
+        return processor
+
+    # Count the rows once, outside the timed runs
+    rows = sum(len(block) for block in Dataloader.iter_chunks(filename, STREAM_CHUNK_ROWS))
+    processor = aggregate()
+
+    stages = [
+        ('stream', aggregate),
+        ('save', lambda: processor.save_results(workdir, data_name)),
+    ]
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name, fn in stages:
+            seconds, _ = time_call(fn, repeat)
+            results[name] = {'seconds': seconds, 'peak_mb': peak_memory(fn) / 2 ** 20}
+    return rows, results
+
+
+def bench_synthetic(rows: int, seed: int = 0, threshold: float = 0.5, repeat: int = 3,
+                    workdir: Optional[str] = None, check_limit: int = CHECK_LIMIT_ROWS,
+                    stream_limit: int = STREAM_LIMIT_ROWS) -> Dict[str, Any]:
+    """
+    Time and measure the peak memory of parsing, cropping, aggregating and saving a synthetic
+    log of `rows` samples (generated once per size and seed in `workdir`). Logs up to
+    `check_limit` rows are also checked against the legacy implementations. Logs over
+    `stream_limit` rows do not fit in memory whole, so only streaming them is benchmarked
+    (see bench_streamed). Returns the results as a history entry.
+    """
+    workdir = workdir or os.path.join(tempfile.gettempdir(), 'imu_benchmark')
+    os.makedirs(workdir, exist_ok=True)
+    filename = os.path.join(workdir, f'synthetic_{rows}_{seed}.TXT')
+    if not os.path.exists(filename):
+        print(f"Generating {rows} rows into {filename}...")
+        generate_log(filename + '.part', rows, seed)
+        os.replace(filename + '.part', filename)
+
+    entry = {
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'seed': seed,
+        'threshold': threshold,
+    }
+    if rows > stream_limit:
+        entry['rows'], entry['stages'] = bench_streamed(filename, threshold, repeat, workdir, f'synthetic_{rows}_{seed}')
+        entry['matches_legacy'] = None
+        return entry
+
+    dl = Dataloader.read_file(filename, use_cache=False)
+
+    # Crop to the middle half of the log
+    timestamps = dl.timestamps
+    start_time, end_time = (' '.join(map(str, parts)) for parts in
+                            from_epoch_seconds(timestamps[[len(dl) // 4, 3 * len(dl) // 4]]))
+
+    # A fresh Dataloader over the same samples, so no run reuses the activity computed by another
+    def fresh() -> Dataloader:
+        return Dataloader(dl.metadata, layout=dl.layout, timestamps=dl.timestamps, xyz=dl.xyz, decimals=dl.decimals)
+
+    processor = Processor(fresh())
+    processor.process_imu_data(threshold)
+
+    # Packed copy of the log, to compare with parsing the text
+    packed_filename = os.path.splitext(filename)[0] + PACKED_SUFFIX
+    if not os.path.exists(packed_filename):
+        dl.write_packed(packed_filename)
+
+    stages = [
+        ('parse', lambda: Dataloader.read_file(filename, use_cache=False)),
+        ('read_packed', lambda: Dataloader.read_file(packed_filename)),
+        ('crop', lambda: fresh().crop(start_time, end_time)),
+        ('aggregate', lambda: Processor(fresh()).process_imu_data(threshold)),
+        ('save', lambda: processor.save_results(workdir, f'synthetic_{rows}_{seed}')),
+    ]
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name, fn in stages:
+            seconds, _ = time_call(fn, repeat)
+            results[name] = {'seconds': seconds, 'peak_mb': peak_memory(fn) / 2 ** 20}
+
+    # Same outputs as the original implementations
+    matches = None
+    if rows <= check_limit:
+        with contextlib.redirect_stdout(io.StringIO()):
+            _, legacy_raw = legacy_read_file(filename)
+            cropped = fresh().crop(start_time, end_time)
+        matches = bool(matches_legacy(dl, legacy_raw, Dataloader.sniff_layout(filename)) and
+                       np.array_equal(cropped.raw_data, legacy_crop(dl.raw_data, start_time, end_time)) and
+                       np.array_equal(processor.result_with_counts, legacy_process_imu_data(dl.raw_data, threshold)))
+
+    entry.update(rows=len(dl), stages=results, matches_legacy=matches)
+    return entry
+
+
+def load_history(path: str) -> List[Dict[str, Any]]:
+    if not os.path.exists(path):
+        return []
+    with open(path) as file:
+        return json.load(file)
+
+
+def save_history(path: str, history: List[Dict[str, Any]]) -> None:
+    with open(path, 'w') as file:
+        json.dump(history, file, indent=1)
+
+
+def print_synthetic(entry: Dict[str, Any], previous: Optional[Dict[str, Any]]) -> None:
+    """
+    Print the results of a synthetic run, relative to the previous run of the same size and seed.
+    """
+    against = f" (vs {previous['commit'] or previous['date']})" if previous else ''
+    checked = {True: 'matches legacy', False: 'DIFFERS FROM LEGACY', None: 'not checked'}[entry['matches_legacy']]
+    print(f"{entry['rows']} rows, seed {entry['seed']}: {checked}")
+    print(f"  {'stage':12s} {'time (s)':>10s} {'peak (MB)':>10s}  change{against}")
+    for name, result in entry['stages'].items():
+        change = ''
+        if previous and name in previous['stages']:
+            before = previous['stages'][name]
+            change = (f"{result['seconds'] / before['seconds']:5.2f}x time  "
+                      f"{result['peak_mb'] / max(before['peak_mb'], 1e-9):5.2f}x memory")
+        print(f"  {name:12s} {result['seconds']:10.4f} {result['peak_mb']:10.1f}  {change}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the IMU data file parser and processor.")
+    parser.add_argument('files', nargs='*', help="Data files to parse (default: DATA/*.TXT)")
+    parser.add_argument('--repeat', type=int, default=3, help="Number of timed runs per file")
+    parser.add_argument('--threshold', type=float, default=0.5, help="Threshold used for the processing benchmark")
+    parser.add_argument('--synthetic', nargs='+', metavar='ROWS',
+                        help="Benchmark synthetic logs of these sizes instead (e.g. 10k 1M 100M)")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the synthetic logs")
+    parser.add_argument('--workdir', help="Directory the synthetic logs are generated in (default: a temp directory)")
+    parser.add_argument('--history', default=DEFAULT_HISTORY_PATH, help="JSON file the synthetic results are appended to")
+    parser.add_argument('--check-limit', type=int, default=CHECK_LIMIT_ROWS,
+                        help="Check synthetic logs up to this size against the legacy implementations")
+    parser.add_argument('--stream-limit', type=int, default=STREAM_LIMIT_ROWS,
+                        help="Benchmark larger synthetic logs by streaming them in blocks instead of loading them whole")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        history = load_history(args.history)
+        for size in args.synthetic:
+            entry = bench_synthetic(parse_size(size), args.seed, args.threshold, args.repeat, args.workdir, args.check_limit,
+                                    args.stream_limit)
+            previous = next((e for e in reversed(history) if e['rows'] == entry['rows'] and e['seed'] == entry['seed']), None)
+            print_synthetic(entry, previous)
+            history.append(entry)
+            save_history(args.history, history)
+        raise SystemExit
+
+    files = args.files or sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'DATA', '*.TXT')))
+    bench_read_file(files, args.repeat)
+    print()
+    bench_process(files, args.threshold, args.repeat)
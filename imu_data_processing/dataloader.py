@@ -1,95 +1,815 @@
-from typing import List, Any
+import hashlib
+import json
+import os
+import re
+import struct
+import warnings
+from itertools import islice
+from typing import Callable, Dict, List, Any, NamedTuple, Iterable, Iterator, Optional, Tuple
 from numpy.typing import NDArray
 import numpy as np
 import pandas as pd
 
+from activity import DEFAULT_METRIC, FLOAT64_METRICS, compute_activity
+from instrument import span, traced
+
+# Normalized column layout of Dataloader.raw_data
+COLUMNS = ['year', 'month', 'day', 'hour', 'minute', 'second', 'x', 'y', 'z']
+
+# Number of bytes read from the start of a file to detect its layout
+SNIFF_BYTES = 4096
+
+# Parsed-data cache written next to each data file (<file>.cache.npy + <file>.cache.json).
+# Bump CACHE_VERSION whenever the cached representation changes.
+CACHE_SUFFIX = '.cache'
+CACHE_VERSION = 2
+
+# Compact record of one sample (20 bytes): epoch seconds and float32 x, y, z
+SAMPLE_DTYPE = np.dtype([('epoch', np.int64), ('xyz', np.float32, (3,))])
+
+# Largest number of decimals looked for when detecting the precision of x, y and z
+MAX_DECIMALS = 6
+
+# Number of records decoded per chunk when reading a file with progress reporting
+PROGRESS_CHUNK_ROWS = 200_000
+
+# Packed binary logs (<name>.pack): a 32-byte header followed by fixed-width little-endian records
+#     -  header: magic, format version, layout (0 timestamped, 1 xyz), axes (0 int16, 1 float32),
+#        decimals of x, y and z (int16 axes hold round(value * 10^decimals)), number of records
+#     -  record: int64 epoch seconds (timestamped logs only), then x, y, z as int16 or float32
+# Bump PACKED_VERSION whenever the format changes.
+PACKED_SUFFIX = '.pack'
+PACKED_MAGIC = b'IMUPACK\x00'
+PACKED_VERSION = 1
+PACKED_HEADER = struct.Struct('<8sHBBbxxxQ')
+PACKED_HEADER_SIZE = 32
+PACKED_LAYOUTS = ('timestamped', 'xyz')
+PACKED_AXES = ('int16', 'float32')
+
+
+class LogLayout(NamedTuple):
+    """
+    Layout of a data file, as detected from its first line:
+        -  name: 'timestamped' (year month day hour minute second x y z) or 'xyz' (x y z only)
+        -  header: whether the first line holds column titles rather than a sample
+        -  n_fields: number of whitespace-separated fields per record
+    """
+    name: str
+    header: bool
+    n_fields: int
+
+
+# Layout names keyed on the number of fields per record
+LAYOUTS = {len(COLUMNS): 'timestamped', 3: 'xyz'}
+
+
+def to_epoch_seconds(time_parts: NDArray) -> NDArray[np.int64]:
+    """
+    Convert (year, month, day, hour, minute, second) rows into integer seconds
+    since 1970-01-01, vectorized over all rows (proleptic Gregorian calendar).
+    """
+    parts = np.asarray(time_parts).astype(np.int64)
+    year, month, day = parts[:, 0], parts[:, 1], parts[:, 2]
+
+    # Shift the year to start in March so the leap day falls at the end
+    year = year - (month <= 2)
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * ((month + 9) % 12) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 + day_of_year
+    days = era * 146097 + day_of_era - 719468
+
+    return days * 86400 + parts[:, 3] * 3600 + parts[:, 4] * 60 + parts[:, 5]
+
+
+def from_epoch_seconds(epoch: NDArray[np.int64]) -> NDArray[np.int64]:
+    """
+    Convert integer seconds since 1970-01-01 back into
+    (year, month, day, hour, minute, second) rows, vectorized over all rows.
+    """
+    epoch = np.asarray(epoch, dtype=np.int64)
+    days, seconds = np.divmod(epoch, 86400)
+
+    days = days + 719468
+    era = days // 146097
+    day_of_era = days - era * 146097
+    year_of_era = (day_of_era - day_of_era // 1460 + day_of_era // 36524 - day_of_era // 146096) // 365
+    day_of_year = day_of_era - (365 * year_of_era + year_of_era // 4 - year_of_era // 100)
+    month_from_march = (5 * day_of_year + 2) // 153
+    day = day_of_year - (153 * month_from_march + 2) // 5 + 1
+    month = np.where(month_from_march < 10, month_from_march + 3, month_from_march - 9)
+    year = year_of_era + era * 400 + (month <= 2)
+
+    return np.column_stack((year, month, day, seconds // 3600, seconds // 60 % 60, seconds % 60))
+
+
 class Dataloader():
     """
     Base Dataloader class that performs some basic functionalities:
-        -  Read the data files as a .csv
-        -  Store basic file properties given on the first line of the data files
+        -  Read the data files and detect their layout (with/without header, with/without timestamps)
+        -  Normalize every layout into the (year, month, day, hour, minute, second, x, y, z) schema
         -  Retrieve the individual coordinate points as an array of tuples
+    The samples are held compactly as int64 epoch seconds plus float32 x, y, z (20 bytes per
+    sample); the 9-column float64 `raw_data` table is only built when something asks for it.
     """
     def __init__(
         self,
         metadata: List[Any],
-        raw_data: NDArray[np.float32],
+        raw_data: Optional[NDArray[np.float64]] = None,
         start_time: str = None,
-        end_time: str = None
+        end_time: str = None,
+        layout: str = 'timestamped',
+        timestamps: NDArray[np.int64] = None,
+        xyz: Optional[NDArray[np.float32]] = None,
+        decimals: Optional[int] = None
     ) -> None:
 
         # Stores metadata of the data file
         self.metadata: List[Any] = metadata
 
-        # Store tuples of (x, y, z) coordinates read from the file
-        self.raw_data: NDArray[np.float32] = raw_data
+        # Legacy (year, month, day, hour, minute, second, x, y, z) table, built on first use
+        # unless it is given
+        self._raw_data: Optional[NDArray[np.float64]] = raw_data
+
+        # (x, y, z) of every sample as float32, and the number of decimals they were logged
+        # with (None if unknown), which lets the exact float64 values be recovered
+        self._xyz: Optional[NDArray[np.float32]] = xyz
+        self.decimals: Optional[int] = decimals
+
+        # Store the layout the data was read from
+        self.layout: str = layout
+
+        # Epoch seconds of every sample, computed once on first use
+        self._timestamps: Optional[NDArray[np.int64]] = timestamps
+        self._is_monotonic: Optional[bool] = None
+        self._sample_times: Optional[NDArray[np.float64]] = None
+
+        # Per-sample activity signals computed so far, keyed on the metric name
+        self._activity: Dict[str, NDArray] = {}
+
+        # (start, end) epoch seconds of the gaps in the data, set by resample()
+        self.gaps: Optional[NDArray[np.float64]] = None
+
+    @staticmethod
+    def from_records(records: NDArray[np.float64], layout: LogLayout) -> 'Dataloader':
+        """
+        Build a compact Dataloader from decoded records of the given layout.
+        """
+        timestamps = to_epoch_seconds(records[:, :6]) if layout.name == 'timestamped' else None
+        xyz = records[:, -3:]
+        return Dataloader(list(COLUMNS), layout=layout.name, timestamps=timestamps,
+                          xyz=xyz.astype(np.float32), decimals=Dataloader._count_decimals(xyz))
+
+    # Smallest number of decimals that represents every value exactly, or None
+    @staticmethod
+    def _count_decimals(values: NDArray[np.float64]) -> Optional[int]:
+        for decimals in range(MAX_DECIMALS + 1):
+            if np.array_equal(np.round(values, decimals), values):
+                return decimals
+        return None
+
+    def __len__(self) -> int:
+        return len(self._xyz) if self._xyz is not None else len(self._raw_data)
+
+    @property
+    def xyz(self) -> NDArray[np.float32]:
+        """
+        (x, y, z) of every sample as float32.
+        """
+        if self._xyz is None:
+            self._xyz = self._raw_data[:, -3:].astype(np.float32)
+        return self._xyz
+
+    def xyz_float64(self) -> NDArray[np.float64]:
+        """
+        (x, y, z) of every sample as float64, identical to the values parsed from the file
+        when their number of decimals is known.
+        """
+        if self._raw_data is not None:
+            return self._raw_data[:, -3:]
+
+        xyz = self.xyz.astype(np.float64)
+        if self.decimals is not None:
+            # Rounding the widened float32 gives back the closest float64 to the logged decimal
+            np.round(xyz, self.decimals, out=xyz)
+        return xyz
+
+    @property
+    def raw_data(self) -> NDArray[np.float64]:
+        """
+        Legacy (year, month, day, hour, minute, second, x, y, z) float64 table, built
+        on first use (72 bytes per sample: prefer timestamps and xyz in new code).
+        """
+        if self._raw_data is None:
+            with span('build_raw_data', len(self)):
+                raw_data = np.full((len(self), len(COLUMNS)), np.nan)
+                if self.has_timestamps:
+                    raw_data[:, :6] = from_epoch_seconds(self.timestamps)
+                raw_data[:, -3:] = self.xyz_float64()
+                self._raw_data = raw_data
+        return self._raw_data
+
+    @property
+    def has_timestamps(self) -> bool:
+        """
+        Whether the data carries timestamps (xyz-only logs do not).
+        """
+        return self.layout != 'xyz'
+
+    @property
+    def timestamps(self) -> NDArray[np.int64]:
+        """
+        Integer seconds since 1970-01-01 of every sample, derived from the date columns.
+        """
+        if self._timestamps is None:
+            self._require_timestamps()
+            self._timestamps = to_epoch_seconds(self.raw_data[:, :6])
+        return self._timestamps
+
+    @property
+    def sample_times(self) -> NDArray[np.float64]:
+        """
+        Fractional epoch seconds of every sample. The RTC only records whole seconds,
+        so the samples logged within the same second are spaced evenly across it.
+        """
+        if self._sample_times is None:
+            self._sample_times = Dataloader._spread_within_seconds(self.timestamps)
+        return self._sample_times
+
+    @staticmethod
+    def _spread_within_seconds(timestamps: NDArray[np.int64]) -> NDArray[np.float64]:
+        if len(timestamps) == 0:
+            return timestamps.astype(np.float64)
+
+        # Runs of consecutive samples sharing the same second
+        starts = np.flatnonzero(np.concatenate(([True], timestamps[1:] != timestamps[:-1])))
+        lengths = np.diff(np.concatenate((starts, [len(timestamps)])))
+        run = np.repeat(np.arange(len(starts)), lengths)
+        rank = np.arange(len(timestamps)) - starts[run]
+
+        # The first and last seconds of a log are usually partial: space them at the
+        # typical sample rate (and anchor the first one to the end of its second)
+        spacing = lengths.astype(np.float64)
+        offset = np.zeros(len(starts))
+        if len(starts) > 2:
+            typical = np.median(lengths[1:-1])
+            spacing[0] = max(lengths[0], typical)
+            spacing[-1] = max(lengths[-1], typical)
+            offset[0] = spacing[0] - lengths[0]
+
+        return timestamps + (rank + offset[run]) / spacing[run]
+
+    def activity(self, metric: str = DEFAULT_METRIC) -> NDArray:
+        """
+        Per-sample activity signal (see activity.METRICS), computed once per metric
+        and shared by everything that uses this Dataloader.
+        """
+        if metric not in self._activity:
+            with span(f'activity:{metric}', len(self)):
+                xyz = self.xyz_float64() if metric in FLOAT64_METRICS else self.xyz
+                self._activity[metric] = compute_activity(xyz, metric)
+        return self._activity[metric]
+
+    @property
+    def is_monotonic(self) -> bool:
+        """
+        Whether the timestamps never go backwards (they can after an RTC reset).
+        """
+        if self._is_monotonic is None:
+            timestamps = self.timestamps
+            self._is_monotonic = bool(np.all(timestamps[1:] >= timestamps[:-1]))
+        return self._is_monotonic
 
     # Construct a Dataloader class given a data file
     @staticmethod
-    def read_file(filename: str) -> 'Dataloader':
-        # Read data file as CSV & construct a dataframe
-        df = pd.read_csv(filename)
+    @traced('read_file')
+    def read_file(filename: str, use_cache: bool = True,
+                  progress: Optional[Callable[[float], None]] = None) -> 'Dataloader':
+        """
+        Read a data file. `progress`, if given, is called with the fraction of the file
+        decoded after every chunk (it may raise to abandon the read).
+        """
+        # Packed binary logs are memory-mapped as they are: nothing to parse or cache
+        if Dataloader.is_packed(filename):
+            with span('read_packed'):
+                dl = Dataloader.read_packed(filename)
+            if progress is not None:
+                progress(1.0)
+            return dl
 
-        # Extract metadata from dataframe column titles
-        metadata = Dataloader._read_metadata(df)
+        # Reopen the parsed columns from the sidecar cache if it is still valid
+        if use_cache:
+            with span('load_cache'):
+                cached = Dataloader._load_cache(filename)
+            if cached is not None:
+                if progress is not None:
+                    progress(1.0)
+                return cached
 
-        # Extract raw data (coordinates) from data file
-        raw_data: NDArray[np.float32] = Dataloader._read_raw_data(df)
+            # Fingerprint the file before parsing so a log that grows meanwhile is detected as stale
+            with span('file_digest'):
+                stat = os.stat(filename)
+                digest = Dataloader.file_digest(filename)
 
-        return Dataloader(metadata, raw_data)
+        # Detect the file layout from its first bytes
+        layout = Dataloader.sniff_layout(filename)
+
+        # Decode the records with the layout's bulk decoder (chunk by chunk when reporting progress)
+        with span('parse') as s:
+            if progress is None:
+                records = Dataloader._read_records(filename, layout)
+            else:
+                records = Dataloader._read_records_chunked(filename, layout, progress)
+            s.rows = len(records)
+
+        # Keep the epoch seconds and x, y, z in the compact representation
+        with span('compact', len(records)):
+            dl = Dataloader.from_records(records, layout)
+
+        if use_cache:
+            with span('save_cache', len(dl)):
+                Dataloader._save_cache(filename, dl, stat, digest)
+
+        return dl
+
+    @staticmethod
+    def _cache_paths(filename: str) -> Tuple[str, str]:
+        return filename + CACHE_SUFFIX + '.npy', filename + CACHE_SUFFIX + '.json'
 
-    # Reads the data file's metadata from dataframe
     @staticmethod
-    def _read_metadata(df: pd.DataFrame) -> List[Any]:
-        return list(df.columns.values)
+    def file_digest(filename: str) -> str:
+        """
+        Content hash of a data file (used to key the parsed-data and result caches).
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        with open(filename, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return digest.hexdigest()
 
-    # Reads (x, y, z) coordinates from each row
     @staticmethod
-    def _read_raw_data(df: pd.DataFrame) -> NDArray[np.float32]:
-        raw_data = []
+    def _load_cache(filename: str) -> Optional['Dataloader']:
+        """
+        Reopen a file's parsed columns from its sidecar cache, or return None if
+        there is no cache or it no longer matches the file (size, mtime, content).
+        """
+        data_path, info_path = Dataloader._cache_paths(filename)
+        try:
+            with open(info_path, 'r') as f:
+                info = json.load(f)
+            stat = os.stat(filename)
+        except (OSError, ValueError):
+            return None
 
-        # Extract all the coordinates from dataframe
-        for _, row in df.iterrows():
-            raw_data.append([float(coord) for coord in row.values[0].split()])
+        if info.get('version') != CACHE_VERSION or info.get('size') != stat.st_size:
+            return None
+
+        if info.get('mtime_ns') != stat.st_mtime_ns:
+            # The file was touched or copied: only trust the cache if its content is unchanged
+            if info.get('digest') != Dataloader.file_digest(filename):
+                return None
+            info['mtime_ns'] = stat.st_mtime_ns
+            Dataloader._write_cache_info(info_path, info)
+
+        # Memory-map the samples so only the pages that are used get read
+        try:
+            samples = np.load(data_path, mmap_mode='r')
+        except (OSError, ValueError):
+            return None
+
+        if samples.dtype != SAMPLE_DTYPE or samples.shape != (info.get('rows'),):
+            return None
+
+        timestamps = samples['epoch'] if info['layout'] != 'xyz' else None
+        return Dataloader(list(COLUMNS), layout=info['layout'], timestamps=timestamps,
+                          xyz=samples['xyz'], decimals=info.get('decimals'))
+
+    @staticmethod
+    def _save_cache(filename: str, dl: 'Dataloader', stat: os.stat_result, digest: str) -> None:
+        """
+        Store the parsed samples as SAMPLE_DTYPE records next to the data file. Failing to
+        write the cache (e.g. read-only media) is not an error.
+        """
+        # Empty arrays cannot be memory-mapped
+        if len(dl) == 0:
+            return
+
+        samples = np.zeros(len(dl), dtype=SAMPLE_DTYPE)
+        if dl.has_timestamps:
+            samples['epoch'] = dl.timestamps
+        samples['xyz'] = dl.xyz
+
+        data_path, info_path = Dataloader._cache_paths(filename)
+        info = {
+            'version': CACHE_VERSION,
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'digest': digest,
+            'layout': dl.layout,
+            'rows': len(dl),
+            'decimals': dl.decimals,
+        }
+
+        try:
+            # Write to a temporary file first so a reader never sees a partial cache
+            with open(data_path + '.tmp', 'wb') as f:
+                np.save(f, samples)
+            os.replace(data_path + '.tmp', data_path)
+        except OSError:
+            return
+
+        Dataloader._write_cache_info(info_path, info)
+
+    @staticmethod
+    def _write_cache_info(info_path: str, info: dict) -> None:
+        try:
+            with open(info_path + '.tmp', 'w') as f:
+                json.dump(info, f)
+            os.replace(info_path + '.tmp', info_path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def is_packed(filename: str) -> bool:
+        """
+        Whether a data file is a packed binary log (detected from its first bytes, not its name).
+        """
+        with open(filename, 'rb') as f:
+            return f.read(len(PACKED_MAGIC)) == PACKED_MAGIC
+
+    @staticmethod
+    def _packed_dtype(layout: str, axes: str) -> np.dtype:
+        fields = [('epoch', '<i8')] if layout == 'timestamped' else []
+        fields.append(('xyz', '<i2' if axes == 'int16' else '<f4', (3,)))
+        return np.dtype(fields)
+
+    @staticmethod
+    def _read_packed_header(filename: str) -> Tuple[str, str, Optional[int], int]:
+        """
+        Check a packed log's header and size. Returns its layout, axes, decimals and number of records.
+        """
+        with open(filename, 'rb') as f:
+            header = f.read(PACKED_HEADER_SIZE)
+        if len(header) < PACKED_HEADER_SIZE:
+            raise ValueError(f"{filename} is not a packed log: its header is truncated")
+
+        magic, version, layout, axes, decimals, rows = PACKED_HEADER.unpack_from(header)
+        if magic != PACKED_MAGIC:
+            raise ValueError(f"{filename} is not a packed log")
+        if version != PACKED_VERSION:
+            raise ValueError(f"{filename} is a version {version} packed log, expected version {PACKED_VERSION}")
+        if layout >= len(PACKED_LAYOUTS) or axes >= len(PACKED_AXES) or (PACKED_AXES[axes] == 'int16' and decimals < 0):
+            raise ValueError(f"{filename} has an unknown packed layout")
+
+        layout, axes = PACKED_LAYOUTS[layout], PACKED_AXES[axes]
+        expected = PACKED_HEADER_SIZE + rows * Dataloader._packed_dtype(layout, axes).itemsize
+        if os.path.getsize(filename) != expected:
+            raise ValueError(f"{filename} is truncated or corrupted: expected {expected} bytes")
+        return layout, axes, (decimals if decimals >= 0 else None), rows
+
+    @staticmethod
+    def read_packed(filename: str) -> 'Dataloader':
+        """
+        Open a packed binary log. The records are memory-mapped and used in place: only int16
+        axes are converted (to float32) in one vectorized pass.
+        """
+        layout, axes, decimals, rows = Dataloader._read_packed_header(filename)
+        dtype = Dataloader._packed_dtype(layout, axes)
+
+        # Empty files cannot be memory-mapped
+        if rows:
+            records = np.memmap(filename, dtype=dtype, mode='r', offset=PACKED_HEADER_SIZE, shape=(rows,))
+        else:
+            records = np.zeros(0, dtype=dtype)
+
+        if axes == 'int16':
+            # The quotient is correctly rounded, so it is the float32 closest to the logged value
+            xyz = records['xyz'].astype(np.float32)
+            xyz /= np.float32(10 ** decimals)
+        else:
+            xyz = records['xyz']
+
+        timestamps = records['epoch'] if layout == 'timestamped' else None
+        return Dataloader(list(COLUMNS), layout=layout, timestamps=timestamps, xyz=xyz, decimals=decimals)
+
+    def write_packed(self, filename: str, axes: Optional[str] = None) -> str:
+        """
+        Save the samples as a packed binary log that reads back to exactly the same values.
+        `axes` is 'int16' (2 bytes per value, for values of known precision within
+        +/-32767 units of their last decimal) or 'float32'; by default the smallest that
+        is lossless. Returns the axes used.
+        """
+        if self.decimals is None:
+            raise ValueError("The x, y, z values have more than "
+                             f"{MAX_DECIMALS} decimals and cannot be packed losslessly")
+
+        scaled = np.rint(self.xyz_float64() * 10 ** self.decimals)
+        fits_int16 = not len(scaled) or np.abs(scaled).max() <= np.iinfo(np.int16).max
+        axes = axes or ('int16' if fits_int16 else 'float32')
+        if axes not in PACKED_AXES:
+            raise ValueError(f"Unknown packed axes {axes!r}, expected one of {', '.join(PACKED_AXES)}")
+        if axes == 'int16' and not fits_int16:
+            raise ValueError("The x, y, z values do not fit in int16 axes: use float32")
+
+        records = np.zeros(len(self), dtype=Dataloader._packed_dtype(self.layout, axes))
+        if self.has_timestamps:
+            records['epoch'] = self.timestamps
+        records['xyz'] = scaled if axes == 'int16' else self.xyz
+
+        header = PACKED_HEADER.pack(PACKED_MAGIC, PACKED_VERSION, PACKED_LAYOUTS.index(self.layout),
+                                    PACKED_AXES.index(axes), self.decimals, len(records))
+
+        # Write to a temporary file first so a reader never sees a partial log
+        with open(filename + '.tmp', 'wb') as f:
+            f.write(header.ljust(PACKED_HEADER_SIZE, b'\x00'))
+            records.tofile(f)
+        os.replace(filename + '.tmp', filename)
+        return axes
+
+    @staticmethod
+    def iter_chunks(filename: str, rows: int = 100_000) -> Iterator[NDArray[np.float64]]:
+        """
+        Stream a data file as normalized blocks of at most `rows` records, so that
+        arbitrarily long logs can be processed with bounded memory.
+        """
+        if Dataloader.is_packed(filename):
+            # Only the pages of the current block of the mapped records are read
+            dl = Dataloader.read_packed(filename)
+            for first in range(0, len(dl), rows):
+                window = Dataloader(dl.metadata, layout=dl.layout, xyz=dl.xyz[first:first + rows], decimals=dl.decimals,
+                                    timestamps=dl.timestamps[first:first + rows] if dl.has_timestamps else None)
+                yield window.raw_data
+            return
+
+        layout = Dataloader.sniff_layout(filename)
+
+        with open(filename, 'r', encoding='ascii', errors='replace') as f:
+            # Skip the header line
+            if layout.header:
+                f.readline()
+
+            while True:
+                lines = list(islice(f, rows))
+                if not lines:
+                    break
+
+                try:
+                    records = np.loadtxt(lines, dtype=np.float64, ndmin=2)
+                    if records.size and records.shape[1] != layout.n_fields:
+                        raise ValueError(f"{filename}: expected {layout.n_fields} fields per record")
+                except ValueError:
+                    records = Dataloader._decode_lines_tolerant(lines, layout, filename)
+
+                if records.size:
+                    yield Dataloader._normalize(records, layout)
+
+    @staticmethod
+    def sniff_layout(filename: str) -> LogLayout:
+        """
+        Detect the layout of a data file from its first line, without parsing the whole file.
+        """
+        with open(filename, 'rb') as f:
+            head = f.read(SNIFF_BYTES)
+
+        # Packed logs carry their layout in their header
+        if head.startswith(PACKED_MAGIC):
+            layout = Dataloader._read_packed_header(filename)[0]
+            return LogLayout(layout, False, len(COLUMNS) if layout == 'timestamped' else 3)
+
+        first_line = head.split(b'\n', 1)[0].replace(b'\x00', b'').decode('ascii', errors='replace')
+        return Dataloader.layout_from_line(first_line, filename)
+
+    @staticmethod
+    def layout_from_line(first_line: str, source: str) -> LogLayout:
+        """
+        Detect the layout of a log from its first line (`source` names the log in errors).
+        """
+        fields = first_line.split()
+        if not fields:
+            raise ValueError(f"{source} is empty or does not start with a record")
+
+        # A first line that does not parse as numbers holds column titles
+        header = not Dataloader._is_numeric(fields)
+
+        name = LAYOUTS.get(len(fields))
+        if name is None:
+            raise ValueError(f"Unrecognized layout in {source}: first line is {first_line.strip()!r}")
+
+        return LogLayout(name, header, len(fields))
+
+    @staticmethod
+    def _is_numeric(fields: List[str]) -> bool:
+        try:
+            [float(field) for field in fields]
+        except ValueError:
+            return False
+        return True
+
+    # Reads the records of a data file with the given layout
+    @staticmethod
+    def _read_records(filename: str, layout: LogLayout) -> NDArray[np.float64]:
+        try:
+            records = np.loadtxt(filename, dtype=np.float64, skiprows=int(layout.header), ndmin=2)
+        except ValueError:
+            # Malformed records (e.g. lines partially overwritten after an SD write failure)
+            return Dataloader._read_records_tolerant(filename, layout)
+
+        if records.size == 0:
+            return np.empty((0, layout.n_fields))
+        return records
+
+    # Reads the records in chunks of lines, reporting the fraction of the file read after each
+    @staticmethod
+    def _read_records_chunked(filename: str, layout: LogLayout, progress: Callable[[float], None],
+                              rows: int = PROGRESS_CHUNK_ROWS) -> NDArray[np.float64]:
+        size = max(os.path.getsize(filename), 1)
+        blocks = []
+        with open(filename, 'rb') as f:
+            done = len(f.readline()) if layout.header else 0
+            while True:
+                lines = list(islice(f, rows))
+                if not lines:
+                    break
+                done += sum(map(len, lines))
+
+                text = [line.decode('ascii', errors='replace') for line in lines]
+                try:
+                    block = np.loadtxt(text, dtype=np.float64, ndmin=2)
+                    if block.size and block.shape[1] != layout.n_fields:
+                        raise ValueError(f"{filename}: expected {layout.n_fields} fields per record")
+                except ValueError:
+                    block = Dataloader._decode_lines_tolerant(text, layout, filename)
+                if block.size:
+                    blocks.append(block)
+                progress(done / size)
+
+        return np.concatenate(blocks) if blocks else np.empty((0, layout.n_fields))
+
+    # Reads the records line by line, recovering records around corrupted bytes
+    @staticmethod
+    def _read_records_tolerant(filename: str, layout: LogLayout) -> NDArray[np.float64]:
+        with open(filename, 'rb') as f:
+            text = f.read().decode('ascii', errors='replace')
+
+        # Drop the header line before decoding
+        lines = text.splitlines()[int(layout.header):]
+        return Dataloader._decode_lines_tolerant(lines, layout, filename)
+
+    # Decodes records one line at a time, skipping (and reporting) malformed ones
+    @staticmethod
+    def _decode_lines_tolerant(lines: Iterable[str], layout: LogLayout, filename: str) -> NDArray[np.float64]:
+        # Treat runs of NUL bytes (unwritten SD blocks) as line breaks
+        lines = [part for line in lines for part in re.split('\x00+', line)]
+
+        records = []
+        skipped = 0
+        for line in lines:
+            fields = line.split()
+            if not fields:
+                continue
+            if len(fields) != layout.n_fields or not Dataloader._is_numeric(fields):
+                skipped += 1
+                continue
+            records.append([float(field) for field in fields])
+
+        if skipped:
+            warnings.warn(f"{filename}: skipped {skipped} malformed record(s)")
+
+        return np.array(records, dtype=np.float64).reshape(-1, layout.n_fields)
+
+    # Maps decoded records onto the normalized column schema
+    @staticmethod
+    def _normalize(records: NDArray[np.float64], layout: LogLayout) -> NDArray[np.float64]:
+        if layout.name == 'timestamped':
+            return records
+
+        # xyz-only logs carry no timestamps: leave the time columns as NaN
+        raw_data = np.full((len(records), len(COLUMNS)), np.nan)
+        raw_data[:, -3:] = records
+        return raw_data
+
+    def _require_timestamps(self) -> None:
+        if not self.has_timestamps:
+            raise ValueError("This data file has no timestamps (x y z only)")
+
+    def find_gaps(self, max_gap: float = 2.0) -> NDArray[np.float64]:
+        """
+        Find the intervals longer than `max_gap` seconds without any sample
+        (failed SD writes, RTC power loss). Returns an array of (start, end) epoch seconds.
+        """
+        times = np.sort(self.sample_times) if not self.is_monotonic else self.sample_times
+        after = np.flatnonzero(np.diff(times) > max_gap)
+        return np.column_stack((times[after], times[after + 1]))
+
+    @traced('resample')
+    def resample(self, rate_hz: float = 10.0, max_gap: float = 2.0) -> 'Dataloader':
+        """
+        Resample x, y and z onto a uniform grid of `rate_hz` samples per second by
+        linear interpolation between the (sub-second) sample times. The grid skips the
+        gaps longer than `max_gap` seconds, which are stored in the result's `gaps`.
+        """
+        times = self.sample_times
+        xyz = self.xyz_float64()
+        if not len(times):
+            dl = Dataloader(self.metadata, layout=self.layout, timestamps=np.empty(0, dtype=np.int64),
+                            xyz=np.empty((0, 3), dtype=np.float32))
+            dl._sample_times = times
+            dl.gaps = np.empty((0, 2))
+            return dl
+        if not self.is_monotonic:
+            order = np.argsort(times, kind='stable')
+            times, xyz = times[order], xyz[order]
+
+        gaps = self.find_gaps(max_gap)
+
+        # Continuous segments between the gaps
+        segment_starts = np.concatenate((times[:1], gaps[:, 1]))
+        segment_ends = np.concatenate((gaps[:, 0], times[-1:]))
+
+        # Grid ticks (integer multiples of 1 / rate_hz) inside every segment, built without a Python loop
+        first_tick = np.ceil(segment_starts * rate_hz).astype(np.int64)
+        last_tick = np.floor(segment_ends * rate_hz).astype(np.int64)
+        counts = np.maximum(last_tick - first_tick + 1, 0)
+        offsets = np.cumsum(counts) - counts
+        ticks = np.arange(counts.sum()) - np.repeat(offsets, counts) + np.repeat(first_tick, counts)
+        grid = ticks / rate_hz
+
+        resampled = np.empty((len(grid), 3), dtype=np.float32)
+        for axis in range(3):
+            resampled[:, axis] = np.interp(grid, times, xyz[:, axis])
+
+        dl = Dataloader(self.metadata, layout=self.layout, timestamps=np.floor(grid).astype(np.int64), xyz=resampled)
+        dl._sample_times = grid
+        dl.gaps = gaps
+        return dl
 
-        return np.array(raw_data)
-    
     def get_first_timestamp(self) -> str:  
         """
         Get the first timestamp from the raw data.
         """
-        return self.raw_data[0, :-3]
+        self._require_timestamps()
+        return from_epoch_seconds(self.timestamps[:1])[0].astype(np.float64)
     
     def get_last_timestamp(self) -> str:
         """
         Get the last timestamp from the raw data.
         """
-        return self.raw_data[-1, :-3]
+        self._require_timestamps()
+        return from_epoch_seconds(self.timestamps[-1:])[0].astype(np.float64)
     
-    def crop(self, start_time: str, end_time: str) -> 'Dataloader':
-        """
-        Crop the data to a specific time range.
-        """
-        # Convert start and end times to datetime objects
-        start_datetime = pd.to_datetime(start_time, format="%Y %m %d %H %M %S")
-        end_datetime = pd.to_datetime(end_time, format="%Y %m %d %H %M %S")
-        print(f"Start time: {start_datetime}, End time: {end_datetime}")
-
-        # Ensure the first 6 columns are numeric
-        raw_data_numeric = self.raw_data[:, :6].astype(int)
-        
-        # Create timestamps from the individual time components
-        timestamps = []
-        for row in raw_data_numeric:
-            year, month, day, hour, minute, second = row
-            timestamp_str = f"{year}-{month:02d}-{day:02d} {hour:02d}:{minute:02d}:{second:02d}"
-            timestamps.append(pd.to_datetime(timestamp_str))
-        
-        timestamps = pd.Series(timestamps)
-        
-        # Filter the raw data based on the time range
-        # Note: We're excluding the start and end times as per your example
-        mask = (timestamps > start_datetime) & (timestamps < end_datetime)
-        cropped_data = self.raw_data[mask]
-        
-        return Dataloader(self.metadata, cropped_data)
\ No newline at end of file
+    @traced('crop')
+    def crop(self, start_time: Optional[str], end_time: Optional[str]) -> 'Dataloader':
+        """
+        Crop the data to a specific time range (start and end times excluded).
+        A start or end time of None leaves that side of the range open.
+        The cropped Dataloader shares its data with this one when the timestamps are sorted,
+        so a window can be cropped again and again from the full data at no cost.
+        """
+        self._require_timestamps()
+        print(f"Start time: {start_time}, End time: {end_time}")
+
+        if self.is_monotonic:
+            # Binary search for the bounds and slice without copying
+            selection = slice(*self.time_bounds(start_time, end_time))
+        else:
+            # Out-of-order timestamps: fall back to a boolean mask
+            start, end = self._parse_bounds(start_time, end_time)
+            selection = (self.timestamps > start) & (self.timestamps < end)
+
+        # Select the same samples from every per-sample array computed so far
+        cropped = Dataloader(self.metadata, layout=self.layout, timestamps=self.timestamps[selection],
+                             xyz=self.xyz[selection], decimals=self.decimals)
+        cropped._is_monotonic = self._is_monotonic
+        if self._raw_data is not None:
+            cropped._raw_data = self._raw_data[selection]
+        if self._sample_times is not None:
+            cropped._sample_times = self._sample_times[selection]
+        for metric, activity in self._activity.items():
+            cropped._activity[metric] = activity[selection]
+        return cropped
+
+    def time_bounds(self, start_time: Optional[str], end_time: Optional[str]) -> Tuple[int, int]:
+        """
+        Index range [first, last) of the samples strictly between the start and end times
+        (None leaves that side open), found by binary search. Needs sorted timestamps.
+        """
+        if not self.is_monotonic:
+            raise ValueError("The timestamps are not sorted: crop() the data instead")
+
+        start, end = self._parse_bounds(start_time, end_time)
+        first = int(np.searchsorted(self.timestamps, start, side='right'))
+        last = max(first, int(np.searchsorted(self.timestamps, end, side='left')))
+        return first, last
+
+    # Converts optional start and end time strings into epoch seconds (open sides beyond the data)
+    def _parse_bounds(self, start_time: Optional[str], end_time: Optional[str]) -> Tuple[int, int]:
+        timestamps = self.timestamps
+        start = Dataloader._parse_time(start_time) if start_time is not None else timestamps.min(initial=0) - 1
+        end = Dataloader._parse_time(end_time) if end_time is not None else timestamps.max(initial=0) + 1
+        return start, end
+
+    # Converts a "Y M D h m s" time string into epoch seconds
+    @staticmethod
+    def _parse_time(time_str: str) -> int:
+        t = pd.to_datetime(time_str, format="%Y %m %d %H %M %S")
+        return int(to_epoch_seconds([[t.year, t.month, t.day, t.hour, t.minute, t.second]])[0])
@@ -0,0 +1,132 @@
+import itertools
+from typing import List, Optional, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+
+def _grown(buffer: NDArray, needed: int) -> NDArray:
+    # Double the capacity of a growing buffer until it holds `needed` entries
+    if needed <= len(buffer):
+        return buffer
+    return np.resize(buffer, max(2 * len(buffer), needed))
+
+
+class MinMaxPyramid:
+    """
+    Multi-resolution min/max summary of a 1-D series, used to plot long series quickly:
+        -  Level 0 is the series itself; every level above summarizes `factor` buckets of the
+           level below by their minimum and maximum (and where they occur)
+        -  view() returns about `max_points` points for any index range, taken from the
+           coarsest level that still has enough resolution, so spikes are never dropped
+        -  extend() updates the summary of a series that grew (e.g. a followed log), recomputing
+           only the buckets of the new values
+    """
+    def __init__(self, values: NDArray[np.float64], factor: int = 4, min_buckets: int = 256) -> None:
+        self.values = np.asarray(values)
+        self.factor = factor
+        self.min_buckets = min_buckets
+
+        # Each level holds (mins, maxs, index of min, index of max) per bucket, in buffers
+        # with room to grow, of which the first `lengths` buckets are used
+        self._buffers: List[Tuple[NDArray, NDArray, NDArray, NDArray]] = []
+        self._lengths: List[int] = []
+        self._update(0)
+
+    @property
+    def levels(self) -> List[Tuple[NDArray, NDArray, NDArray, NDArray]]:
+        return [tuple(buffer[:length] for buffer in buffers) for buffers, length in zip(self._buffers, self._lengths)]
+
+    def extend(self, values: NDArray[np.float64], changed_from: Optional[int] = None) -> None:
+        """
+        Summarize `values`, which start with the values summarized so far, up to index
+        `changed_from` (by default, the number of values summarized so far).
+        """
+        changed_from = len(self.values) if changed_from is None else min(changed_from, len(self.values))
+        self.values = np.asarray(values)
+        self._update(changed_from)
+
+    def _update(self, changed_from: int) -> None:
+        # Rebuild the buckets of every level from the first one covering a changed value,
+        # adding levels while the top one has too many buckets
+        below_length = len(self.values)
+        below = (self.values, self.values)
+        for k in itertools.count():
+            if below_length <= self.min_buckets:
+                del self._buffers[k:], self._lengths[k:]
+                return
+
+            # A new level is built whole
+            first = changed_from // self.factor if k < len(self._buffers) else 0
+            start = first * self.factor
+            if k == 0:
+                index = np.arange(start, below_length)
+                tail = (self.values[start:], self.values[start:], index, index)
+            else:
+                tail = tuple(buffer[start:below_length] for buffer in self._buffers[k - 1])
+            reduced = self._reduce(tail, self.factor)
+            length = first + len(reduced[0])
+
+            if k == len(self._buffers):
+                self._buffers.append(tuple(np.empty(length, dtype=part.dtype) for part in reduced))
+                self._lengths.append(0)
+            self._buffers[k] = tuple(_grown(buffer, length) for buffer in self._buffers[k])
+            for buffer, part in zip(self._buffers[k], reduced):
+                buffer[first:length] = part
+            self._lengths[k] = length
+
+            changed_from, below_length = first, length
+
+    @staticmethod
+    def _reduce(level: Tuple[NDArray, NDArray, NDArray, NDArray], factor: int) -> Tuple[NDArray, NDArray, NDArray, NDArray]:
+        mins, maxs, min_index, max_index = level
+
+        # Pad the last bucket so every bucket has `factor` entries
+        n_buckets = -(-len(mins) // factor)
+        pad = n_buckets * factor - len(mins)
+        mins = np.concatenate((mins, np.full(pad, np.inf))).reshape(n_buckets, factor)
+        maxs = np.concatenate((maxs, np.full(pad, -np.inf))).reshape(n_buckets, factor)
+        min_index = np.concatenate((min_index, np.zeros(pad, dtype=min_index.dtype))).reshape(n_buckets, factor)
+        max_index = np.concatenate((max_index, np.zeros(pad, dtype=max_index.dtype))).reshape(n_buckets, factor)
+
+        rows = np.arange(n_buckets)
+        argmin = mins.argmin(axis=1)
+        argmax = maxs.argmax(axis=1)
+        return mins[rows, argmin], maxs[rows, argmax], min_index[rows, argmin], max_index[rows, argmax]
+
+    def view(self, start: int, stop: int, max_points: int) -> Tuple[NDArray[np.int64], NDArray[np.float64]]:
+        """
+        Return (sample indices, values) of at most about `max_points` points that
+        preserve the minimum and maximum of every bucket in [start, stop).
+        """
+        start = max(0, int(start))
+        stop = min(len(self.values), int(stop))
+        if stop <= start:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=self.values.dtype)
+
+        # Raw samples when they fit, otherwise the finest level with few enough buckets
+        # (every bucket contributes two points)
+        levels = self.levels
+        if stop - start <= max_points or not levels:
+            return np.arange(start, stop), self.values[start:stop]
+
+        # Falls through to the coarsest level if none is coarse enough
+        bucket_size = 1
+        for mins, maxs, min_index, max_index in levels:
+            bucket_size *= self.factor
+            first, last = start // bucket_size, -(-stop // bucket_size)
+            if 2 * (last - first) <= max_points:
+                break
+
+        mins, maxs = mins[first:last], maxs[first:last]
+        min_index, max_index = min_index[first:last], max_index[first:last]
+
+        # Emit each bucket's min and max in the order they occur
+        min_first = min_index <= max_index
+        index = np.empty(2 * len(mins), dtype=np.int64)
+        values = np.empty(2 * len(mins), dtype=self.values.dtype)
+        index[0::2] = np.where(min_first, min_index, max_index)
+        index[1::2] = np.where(min_first, max_index, min_index)
+        values[0::2] = np.where(min_first, mins, maxs)
+        values[1::2] = np.where(min_first, maxs, mins)
+        return index, values
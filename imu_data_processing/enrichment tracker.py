@@ -1,18 +1,30 @@
 import tkinter as tk
-from tkinter import filedialog, messagebox, ttk
+from tkinter import filedialog, messagebox, simpledialog, ttk
 import os
 import numpy as np
 import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+import matplotlib.dates as mdates
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
 import pandas as pd
 import sys
-import threading
 from processor import Processor
+from result_cache import ResultCache, process_cached
+from downsample import MinMaxPyramid
+from activity import DEFAULT_METRIC, METRICS, parse_smoothing, smooth
+from follow import LogFollower
+from results_store import PERIODS, ResultsStore, animal_from_name
+from jobs import JobScheduler
+import instrument
+from instrument import span
 
 # Import the Dataloader class from the dataloader.py file
 # Make sure dataloader.py is in the same directory or in the Python path
 from dataloader import Dataloader
 
+# Matplotlib date number of the Unix epoch: sample times (epoch seconds) are converted to
+# plot coordinates only for the points drawn
+EPOCH_DATENUM = mdates.date2num(np.datetime64(0, 's'))
+
 class IMUDataVisualizerApp:
     def __init__(self, root):
         self.root = root
@@ -28,15 +40,25 @@ class IMUDataVisualizerApp:
         
         # Default settings
         self.auto_save_raw = False
+        self.use_cache = True
+        self.activity_metric = DEFAULT_METRIC
+        self.activity_smoothing = None
         self.threshold_value = 0.5
+        self.follow_interval_ms = 1000
         
         # Create menu bar
         menubar = tk.Menu(root)
         filemenu = tk.Menu(menubar, tearoff=0)
-        filemenu.add_command(label="Open Data File", command=self.open_file)
+        filemenu.add_command(label="Open Data File", command=self.open_file_with_progress)
+        filemenu.add_command(label="Follow Live Log...", command=self.start_following)
+        filemenu.add_command(label="Stop Following", command=self.stop_following)
         filemenu.add_separator()
         filemenu.add_command(label="Exit", command=root.quit)
         menubar.add_cascade(label="File", menu=filemenu)
+        debugmenu = tk.Menu(menubar, tearoff=0)
+        debugmenu.add_command(label="Timing Breakdown...", command=self.show_timing)
+        debugmenu.add_command(label="Export Trace...", command=self.export_trace)
+        menubar.add_cascade(label="Debug", menu=debugmenu)
         root.config(menu=menubar)
         
         # Create top container frame to hold file frame and help button
@@ -179,6 +201,11 @@ class IMUDataVisualizerApp:
                                          command=self.update_time_range, state=tk.DISABLED)
         self.update_range_button.pack(side=tk.LEFT, padx=(15, 0))
         
+        # Reset time range button (back to the whole file)
+        self.reset_range_button = tk.Button(self.end_time_row, text="Reset Time Range",
+                                            command=self.reset_time_range, state=tk.DISABLED)
+        self.reset_range_button.pack(side=tk.LEFT, padx=(5, 0))
+        
         # Create frame for action buttons
         self.action_frame = tk.Frame(root)
         self.action_frame.pack(fill=tk.X, padx=10, pady=5)
@@ -193,7 +220,7 @@ class IMUDataVisualizerApp:
 
         # Update threshold button
         self.update_threshold_button = tk.Button(self.action_frame, text="Update Threshold",
-                            command=lambda: self.plot_imu_data())
+                            command=self.update_threshold)
         self.update_threshold_button.pack(side=tk.LEFT, padx=5)
 
         # Process data button
@@ -226,6 +253,24 @@ class IMUDataVisualizerApp:
                                            command=self.switch_view, state=tk.DISABLED)
         self.processed_radio.pack(side=tk.LEFT)
         
+        self.sensitivity_radio = tk.Radiobutton(self.action_frame, text="Threshold Sensitivity", 
+                                             variable=self.view_var, value="sensitivity", 
+                                             command=self.switch_view, state=tk.DISABLED)
+        self.sensitivity_radio.pack(side=tk.LEFT)
+        
+        # Comparison of the stored results of every animal (does not need a loaded file)
+        self.compare_radio = tk.Radiobutton(self.action_frame, text="Compare Animals by", 
+                                         variable=self.view_var, value="compare", 
+                                         command=self.switch_view)
+        self.compare_radio.pack(side=tk.LEFT)
+        
+        self.compare_period_var = tk.StringVar(value="week")
+        self.compare_period_dropdown = ttk.Combobox(self.action_frame, textvariable=self.compare_period_var,
+                                                    values=[period for period in PERIODS if period != 'hour'],
+                                                    width=6, state="readonly")
+        self.compare_period_dropdown.bind("<<ComboboxSelected>>", self.compare_period_changed)
+        self.compare_period_dropdown.pack(side=tk.LEFT)
+        
         # Create frame for plot
         self.plot_frame = tk.Frame(root)
         self.plot_frame.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
@@ -233,6 +278,10 @@ class IMUDataVisualizerApp:
         # Initialize matplotlib figure
         self.fig, self.ax = plt.subplots(figsize=(9, 6))
         self.canvas = FigureCanvasTkAgg(self.fig, master=self.plot_frame)
+        
+        # Add zoom/pan toolbar below the plot
+        self.toolbar = NavigationToolbar2Tk(self.canvas, self.plot_frame, pack_toolbar=False)
+        self.toolbar.pack(side=tk.BOTTOM, fill=tk.X)
         self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
         
         # Add a status bar
@@ -242,21 +291,106 @@ class IMUDataVisualizerApp:
         self.status_bar.pack(side=tk.BOTTOM, fill=tk.X)
         
         # Initialize data variables
-        self.imu_data = None
         self.imu_data_avg = None
+        self.imu_pyramid = None
+        # Sample times (epoch seconds) the raw data is plotted against, or None for sample numbers
+        self.plot_times = None
+        self.plot_range = (0, 0)
+        self.plot_source = None
+        self.raw_line = None
         self.zoodata_dl = None
+        
+        # The whole loaded file, and the index range of the current time window in it: the
+        # window (self.zoodata_dl) is cut from the full data again whenever it changes
+        self.full_dl = None
+        self.window_range = (0, 0)
         self.current_file_path = None
         self.processed_data = None
         self.processor = None
+        self.sensitivity_processor = None
         self.progress_dialog = None
         self.start_time = None
         self.end_time = None
         
+        # Time window applied to the loaded file, if any (part of the result cache key)
+        self.crop_windows = []
+        self.result_cache = ResultCache()
+        
+        # Results of every saved file, shared across animals and sessions
+        self.results_store = ResultsStore()
+        
+        # Loading, cropping and processing run one at a time on a single background worker
+        self.jobs = JobScheduler(self.root)
+        
+        # Live log being followed, its incremental processor and the pending refresh
+        self.follower = None
+        self.follow_generation = 0
+        self.live_processor = None
+        self.follow_job = None
+        
+        # Whether timing spans also record memory use (Settings > Debug Options)
+        self.trace_memory = False
+        
+    def set_status(self, message, span_name=None):
+        # With timing enabled, follow the message with the breakdown of the named stage
+        if span_name is not None and instrument.is_enabled():
+            timing = instrument.format_breakdown(span_name)
+            if timing:
+                message = f"{message} [{timing}]"
+        self.status_var.set(message)
+    
+    def show_timing(self):
+        timing_window = tk.Toplevel(self.root)
+        timing_window.title("Timing Breakdown")
+        timing_window.geometry("760x420")
+        timing_window.transient(self.root)
+        self.center_window(timing_window)
+        
+        text = tk.Text(timing_window, font=("Courier", 10), wrap=tk.NONE)
+        text.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        def refresh():
+            text.config(state=tk.NORMAL)
+            text.delete("1.0", tk.END)
+            if not instrument.is_enabled() and not instrument.spans():
+                text.insert(tk.END, "Timing is off: enable it in Settings > Debug Options.")
+            else:
+                # Totals per stage, then the last run of each kind of job
+                text.insert(tk.END, instrument.format_summary() + "\n\nLast runs:\n")
+                for name in ("job:load", "job:process", "time_window", "draw:raw", "draw:processed", "draw:sensitivity"):
+                    timing = instrument.format_breakdown(name)
+                    if timing:
+                        text.insert(tk.END, timing + "\n")
+            text.config(state=tk.DISABLED)
+        
+        def clear():
+            instrument.clear()
+            refresh()
+        
+        button_frame = tk.Frame(timing_window)
+        button_frame.pack(pady=(0, 10))
+        tk.Button(button_frame, text="Refresh", command=refresh).pack(side=tk.LEFT, padx=5)
+        tk.Button(button_frame, text="Clear", command=clear).pack(side=tk.LEFT, padx=5)
+        tk.Button(button_frame, text="Export Trace...", command=self.export_trace).pack(side=tk.LEFT, padx=5)
+        tk.Button(button_frame, text="Close", command=timing_window.destroy).pack(side=tk.LEFT, padx=5)
+        refresh()
+    
+    def export_trace(self):
+        if not instrument.spans():
+            messagebox.showwarning("Warning", "No timings recorded. Enable them in Settings > Debug Options.")
+            return
+        output_name = filedialog.asksaveasfilename(title="Export Trace", defaultextension=".json",
+                                                   filetypes=[("Trace files", "*.json")])
+        if output_name:
+            # Opens in chrome://tracing or https://ui.perfetto.dev
+            instrument.export_trace(output_name)
+            self.status_var.set(f"Trace saved to {output_name}")
+    
     def show_settings(self):
         # Create a new window for settings
         settings_window = tk.Toplevel(self.root)
         settings_window.title("Settings")
-        settings_window.geometry("400x150")
+        settings_window.geometry("450x420")
         settings_window.transient(self.root)  # Set as transient to main window
         
         # Center the window
@@ -270,9 +404,66 @@ class IMUDataVisualizerApp:
         tk.Checkbutton(save_frame, text="Auto-save raw data as spreadsheet when loading", 
                       variable=auto_save_var).pack(anchor=tk.W, padx=10)
         
+        # Parse cache settings
+        cache_frame = tk.LabelFrame(settings_window, text="Loading Options")
+        cache_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
+        
+        use_cache_var = tk.BooleanVar(value=self.use_cache)
+        tk.Checkbutton(cache_frame, text="Cache parsed data next to the raw data file for faster reopening", 
+                      variable=use_cache_var).pack(anchor=tk.W, padx=10)
+        
+        def clear_result_cache():
+            self.result_cache.clear()
+            self.status_var.set("Cached processing results cleared")
+        
+        tk.Button(cache_frame, text="Clear Cached Processing Results", 
+                 command=clear_result_cache).pack(anchor=tk.W, padx=10, pady=(0, 5))
+        
+        # Activity metric settings
+        metric_frame = tk.LabelFrame(settings_window, text="Processing Options")
+        metric_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
+        
+        tk.Label(metric_frame, text="Activity metric:").pack(side=tk.LEFT, padx=10, pady=5)
+        metric_var = tk.StringVar(value=self.activity_metric)
+        tk.OptionMenu(metric_frame, metric_var, *METRICS).pack(side=tk.LEFT, pady=5)
+        
+        # Rolling-window smoothing of the activity before thresholding, e.g. min:3 or mean:1s
+        tk.Label(metric_frame, text="Smoothing:").pack(side=tk.LEFT, padx=(10, 5), pady=5)
+        smoothing_var = tk.StringVar(value=str(self.activity_smoothing or 'none'))
+        tk.Entry(metric_frame, textvariable=smoothing_var, width=10).pack(side=tk.LEFT, pady=5)
+        
+        # Timing settings (see Debug > Timing Breakdown)
+        debug_frame = tk.LabelFrame(settings_window, text="Debug Options")
+        debug_frame.pack(fill=tk.X, padx=10, pady=(0, 10))
+        
+        timing_var = tk.BooleanVar(value=instrument.is_enabled())
+        tk.Checkbutton(debug_frame, text="Record the time taken by each loading and processing stage",
+                      variable=timing_var).pack(anchor=tk.W, padx=10)
+        memory_var = tk.BooleanVar(value=self.trace_memory)
+        tk.Checkbutton(debug_frame, text="Also record memory use (slower)",
+                      variable=memory_var).pack(anchor=tk.W, padx=10)
+        
         # Save settings button
         def save_settings():
+            try:
+                smoothing = parse_smoothing(smoothing_var.get())
+            except ValueError as e:
+                messagebox.showerror("Invalid Smoothing", str(e), parent=settings_window)
+                return
+            
             self.auto_save_raw = auto_save_var.get()
+            self.use_cache = use_cache_var.get()
+            self.trace_memory = timing_var.get() and memory_var.get()
+            if timing_var.get():
+                instrument.enable(self.trace_memory)
+            else:
+                instrument.disable()
+            if metric_var.get() != self.activity_metric or smoothing != self.activity_smoothing:
+                self.activity_metric = metric_var.get()
+                self.activity_smoothing = smoothing
+                if self.zoodata_dl is not None:
+                    self.update_imu_data_avg()
+                    self.switch_view()
             settings_window.destroy()
             
         tk.Button(settings_window, text="Save Settings", command=save_settings).pack(pady=10)
@@ -318,35 +509,69 @@ LOADING DATA:
 - Click the 'Open Raw Data File' button to select and load your IMU data file
 - Supported formats include .txt and .csv files
 - The file name will appear next to the button once loaded
+- Packed logs (.pack files made with pack.py) open in a fraction of the time of text logs
 - Raw data visualization will be displayed automatically
+- Parsed data is cached next to the raw data file (.cache.npy/.cache.json) so reopening
+  the same file is almost instant; the cache is rebuilt automatically if the file changes
 
 PROCESSING DATA:
 - After loading a file, enter a threshold value (default is 0.5)
 - Click the 'Process Data' button
 - Processing may take a moment depending on the file size
+- Results are cached, so processing the same file, time range and threshold again is instant
+- Loading and processing show their progress and can be stopped with 'Cancel'
+- After processing, 'Update Threshold' re-processes at the new threshold in the background;
+  when the threshold is changed several times quickly, only the last value is processed
+- The activity compared against the threshold can be chosen in Settings: the mean of x, y
+  and z (default), its absolute value, the vector magnitude minus gravity (1 g), ENMO
+  (magnitude minus gravity, negative values set to zero) or the high-pass filtered magnitude
 - Once complete, you can view the processed data
 
 TIME RANGE:
 - The start and end times of your data will be displayed after loading
 - You can enter custom start and end times and click 'Update Time Range' to filter the data
+- The whole file stays loaded: the time range can be narrowed, moved or widened again at
+  any time, and 'Reset Time Range' goes back to the whole file
+- Plotting, processing and saving raw data all use the selected time range
+
+LIVE DATA:
+- File > Follow Live Log... watches a log file that is still being written (or a serial
+  device the tracker is streaming to) and refreshes the plots every second
+- Only the newly written data is read and processed, using the current threshold
+- File > Stop Following stops watching; opening another file also stops it
 
 VISUALIZATION:
 - Use the 'Raw Data' and 'Processed Data' radio buttons to switch between views
-- Raw data view shows IMU data averages and the threshold as a dotted red line
+- Raw data view shows the per-sample activity and the threshold as a dotted red line
 - Processed data view shows minutes of interaction per hour
+- Threshold Sensitivity view shows the total minutes of interaction for every threshold,
+  with the current threshold as a dotted red line, to help choose a threshold
+
+COMPARING ANIMALS:
+- Saved processed data is also added to a shared results store, under the animal you name
+  when saving (guessed from the file name)
+- The 'Compare Animals by' view shows the minutes of interaction of every animal per day,
+  week or month from that store, without reopening any raw data
 
 SAVING DATA:
 - 'Save Raw Data' button exports the raw data as a spreadsheet
-- 'Save Processed Data' button exports the processed results
+- 'Save Processed Data' button exports the processed results, together with a
+  <name>_bouts.csv file listing every interaction bout (start, end, duration, peak)
 - You will be prompted to select an output directory
 
 SETTINGS:
 - Click the 'Settings' button to access settings
 - You can change the UI scale between normal and large
 - Enable auto-save to automatically save raw data as spreadsheet when loading
+- Disable the parse cache if the data folder is read-only or you do not want extra files
+- Enable timing under Debug Options to see how long loading, processing and drawing take:
+  the status bar then shows the time of each stage, Debug > Timing Breakdown lists them all,
+  and Debug > Export Trace saves them for chrome://tracing or https://ui.perfetto.dev
 
 TIPS:
 - You can resize the window to get a better view of the plots
+- Use the toolbar below the plot to zoom and pan; the raw data is redrawn in full detail
+  for the visible range
 - Use the menu bar's File > Exit option to close the application
 - The status bar at the bottom shows the current state of the application
 
@@ -359,64 +584,67 @@ TIPS:
         close_button = tk.Button(instructions_window, text="Close", command=instructions_window.destroy)
         close_button.pack(pady=10)
         
-    def open_file(self):
-        file_path = filedialog.askopenfilename(
-            filetypes=[("Text files", "*.txt"), ("CSV files", "*.csv"), ("All files", "*.*")]
-        )
-        
-        if file_path:
-            try:
-                self.status_var.set(f"Loading data from {os.path.basename(file_path)}...")
-                self.root.update()
-                
-                # Load data using Dataloader
-                self.zoodata_dl = Dataloader.read_file(file_path)
-                self.imu_data = np.array(self.zoodata_dl.raw_data)
-                self.current_file_path = file_path
-                
-                # Calculate IMU data averages - taking absolute mean of last 3 values in each row
-                self.update_imu_data_avg()
-                
-                # Get and display time range
-                self.update_time_display()
-                
-                # Plot the data
-                self.plot_imu_data()
-                
-                # Update file label
-                self.file_label.config(text=os.path.basename(file_path))
-                
-                # Update window title
-                self.root.title(f"Enrichment Tracking Data Processor - {os.path.basename(file_path)}")
-                
-                # Enable buttons
-                self.process_button.config(state=tk.NORMAL)
-                self.save_raw_button.config(state=tk.NORMAL)
-                self.raw_radio.config(state=tk.NORMAL)
-                self.update_range_button.config(state=tk.NORMAL)
-                
-                # Auto-save raw data if enabled
-                if self.auto_save_raw:
-                    self.save_raw_data(auto=True)
-                
-                self.status_var.set(f"Data loaded successfully. Showing raw data from {os.path.basename(file_path)}")
-                
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to load or process file: {str(e)}")
-                self.status_var.set("Error loading data")
+    def set_full_data(self, zoodata_dl):
+        # A newly loaded file starts with its whole time range selected
+        self.full_dl = zoodata_dl
+        self.zoodata_dl = zoodata_dl
+        self.window_range = (0, len(zoodata_dl))
+        self.crop_windows = []
     
-    def update_imu_data_avg(self):
-        # Calculate IMU data averages - taking absolute mean of last 3 values in each row
-        self.imu_data_avg = []
-        for row in self.imu_data:
-            avg = np.abs(np.mean(row[-3:]))
-            self.imu_data_avg.append(avg)
-        self.imu_data_avg = np.array(self.imu_data_avg)
+    def update_imu_data_avg(self, changed_from=None):
+        # A time window that is a slice of the full data is drawn from the full data, so the
+        # summary below is built once per file and metric and moving the window is instant
+        if self.zoodata_dl is self.full_dl or self.full_dl.is_monotonic:
+            source, self.plot_range = self.full_dl, self.window_range
+        else:
+            source, self.plot_range = self.zoodata_dl, (0, len(self.zoodata_dl))
+        
+        # A followed log that grew (its activity unchanged before `changed_from`): only the
+        # new samples are added to the summary; smoothed activity is computed again whole
+        if (changed_from is not None and self.imu_pyramid is not None and self.activity_smoothing is None and
+                self.plot_source is not None and self.plot_source[1:] == (self.activity_metric, None)):
+            self.plot_source = (source, self.activity_metric, None)
+            self.imu_data_avg = source.activity(self.activity_metric)
+            self.imu_pyramid.extend(self.imu_data_avg, changed_from)
+            self.plot_times = source.sample_times if source.has_timestamps and source.is_monotonic else None
+            return
+        
+        if (self.plot_source is not None and self.plot_source[0] is source and
+                self.plot_source[1:] == (self.activity_metric, self.activity_smoothing)):
+            return
+        self.plot_source = (source, self.activity_metric, self.activity_smoothing)
+        
+        # Activity of every sample, computed once by the Dataloader and shared with the Processor,
+        # smoothed as it is before thresholding (windows in seconds need timestamps)
+        self.imu_data_avg = source.activity(self.activity_metric)
+        smoothing = self.activity_smoothing
+        if smoothing is not None and (source.has_timestamps or not smoothing.seconds):
+            self.imu_data_avg = smooth(self.imu_data_avg, smoothing, source.sample_times if smoothing.seconds else None)
+        
+        # Precompute the multi-resolution summary used to draw the raw data
+        self.imu_pyramid = MinMaxPyramid(self.imu_data_avg)
+        
+        # Plot against real (sub-second) sample times when the log has ordered timestamps,
+        # otherwise against the sample number
+        if source.has_timestamps and source.is_monotonic:
+            self.plot_times = source.sample_times
+        else:
+            self.plot_times = None
     
     def update_time_display(self):
+        if self.zoodata_dl is not None and not self.zoodata_dl.has_timestamps:
+            # x y z only logs cannot be cropped or grouped by hour
+            self.start_time = None
+            self.end_time = None
+            self.start_time_label.config(text="Start Time: Not available")
+            self.end_time_label.config(text="End Time: Not available")
+            return
+
         if self.zoodata_dl is not None:
-            self.start_time = self.zoodata_dl.get_first_timestamp()
-            self.end_time = self.zoodata_dl.get_last_timestamp()
+            # The labels and the allowed range are those of the whole file, so a time
+            # window can be widened again
+            self.start_time = self.full_dl.get_first_timestamp()
+            self.end_time = self.full_dl.get_last_timestamp()
             
             # Update the labels - removed seconds from display
             self.start_time_label.config(text=f"Start Time: {int(self.start_time[0])}/{int(self.start_time[1]):02d}/"
@@ -432,18 +660,20 @@ TIPS:
             self.start_year_dropdown['values'] = years
             self.end_year_dropdown['values'] = years
             
-            # Set initial values for the dropdown menus - no seconds
-            self.start_year_var.set(str(int(self.start_time[0])))
-            self.start_month_var.set(f"{int(self.start_time[1]):02d}")
-            self.start_day_var.set(f"{int(self.start_time[2]):02d}")
-            self.start_hour_var.set(f"{int(self.start_time[3]):02d}")
-            self.start_minute_var.set(f"{int(self.start_time[4]):02d}")
+            # Set the dropdown menus to the current time window - no seconds
+            window_start = self.zoodata_dl.get_first_timestamp()
+            window_end = self.zoodata_dl.get_last_timestamp()
+            self.start_year_var.set(str(int(window_start[0])))
+            self.start_month_var.set(f"{int(window_start[1]):02d}")
+            self.start_day_var.set(f"{int(window_start[2]):02d}")
+            self.start_hour_var.set(f"{int(window_start[3]):02d}")
+            self.start_minute_var.set(f"{int(window_start[4]):02d}")
             
-            self.end_year_var.set(str(int(self.end_time[0])))
-            self.end_month_var.set(f"{int(self.end_time[1]):02d}")
-            self.end_day_var.set(f"{int(self.end_time[2]):02d}")
-            self.end_hour_var.set(f"{int(self.end_time[3]):02d}")
-            self.end_minute_var.set(f"{int(self.end_time[4]):02d}")
+            self.end_year_var.set(str(int(window_end[0])))
+            self.end_month_var.set(f"{int(window_end[1]):02d}")
+            self.end_day_var.set(f"{int(window_end[2]):02d}")
+            self.end_hour_var.set(f"{int(window_end[3]):02d}")
+            self.end_minute_var.set(f"{int(window_end[4]):02d}")
     
     def validate_time_range(self, custom_start_parts, custom_end_parts):
         """
@@ -525,90 +755,88 @@ TIPS:
         custom_start = " ".join(custom_start_parts + ["00"])
         custom_end = " ".join(custom_end_parts + ["00"])
         
-        try:
-            # Create and show progress dialog
-            self.create_progress_dialog("Updating Time Range", "Updating time range, please wait...")
-    
-            # Start the time range update in a separate thread
-            threading.Thread(target=lambda: self.update_time_range_thread(custom_start, custom_end), daemon=True).start()
+        self.apply_time_window(custom_start, custom_end)
     
-        except Exception as e:
-            messagebox.showerror("Error", f"Failed to update time range: {str(e)}")
-            self.status_var.set("Error updating time range")
+    def reset_time_range(self):
+        if self.full_dl is None:
+            return
+        self.apply_time_window(None, None)
     
-    def update_time_range_thread(self, custom_start, custom_end):
-        try:
-            # Use the Dataloader's crop function to get data within the custom time range
-            cropped_data = self.zoodata_dl.crop(custom_start, custom_end)
-
+    def apply_time_window(self, custom_start, custom_end):
+        # The window is cut from the full data every time, as a view whose bounds are found
+        # by binary search, so it can be moved back and forth without reloading or copying
+        with span('time_window'):
+            if custom_start is None and custom_end is None:
+                window, window_range, crop_windows = self.full_dl, (0, len(self.full_dl)), []
+            else:
+                window = self.full_dl.crop(custom_start, custom_end)
+                window_range = self.full_dl.time_bounds(custom_start, custom_end) if self.full_dl.is_monotonic else None
+                crop_windows = [(custom_start, custom_end)]
+            if len(window) == 0:
+                messagebox.showwarning("Invalid Time Range", "There is no data in the selected time range.")
+                return
+        
+            # Processing still queued for the previous time range is no longer wanted
+            self.jobs.cancel("process")
+        
             # Update our data objects
-            self.zoodata_dl = cropped_data
-            self.imu_data = np.array(self.zoodata_dl.raw_data)
-
-            # Update IMU data averages
+            self.zoodata_dl = window
+            self.window_range = window_range
+            self.crop_windows = crop_windows
+        
+            # Update IMU data averages, displayed time range and plot
             self.update_imu_data_avg()
-
-            # Update displayed time range and plot
-            self.root.after(0, self.update_time_display)
-            self.root.after(0, self.plot_imu_data)
-
+            self.update_time_display()
+            self.view_var.set("raw")
+            self.plot_imu_data()
+        
             # Reset processed data since the time range has changed
             self.processed_data = None
-            self.root.after(0, lambda: self.processed_radio.config(state=tk.DISABLED))
-            self.root.after(0, lambda: self.save_processed_button.config(state=tk.DISABLED))
-
-            # Close progress dialog and show success message
-            self.root.after(0, self.update_time_range_complete)
-            self.root.after(0, lambda: self.status_var.set(f"Time range updated: {custom_start} to {custom_end}"))
-            self.root.after(0, lambda: messagebox.showinfo("Success", "Time range updated successfully."))
-
-        except Exception as e:
-            self.root.after(0, self.update_time_range_complete)
-            self.root.after(0, lambda: messagebox.showerror("Error", f"Failed to update time range: {str(e)}"))
-            self.root.after(0, lambda: self.status_var.set("Error updating time range"))
-
-    def update_time_range_complete(self):
-        # Close progress dialog
-        if self.progress_dialog:
-            self.progress_dialog.destroy()
-            self.progress_dialog = None
+            self.processed_radio.config(state=tk.DISABLED)
+            self.save_processed_button.config(state=tk.DISABLED)
+        
+        if crop_windows:
+            self.set_status(f"Time range updated: {custom_start} to {custom_end} ({len(window)} samples)", "time_window")
+        else:
+            self.set_status(f"Time range reset to the whole file ({len(window)} samples)", "time_window")
 
     def open_file_with_progress(self):
         file_path = filedialog.askopenfilename(
-            filetypes=[("Text files", "*.txt"), ("CSV files", "*.csv"), ("All files", "*.*")]
+            filetypes=[("Text files", "*.txt"), ("Packed logs", "*.pack"), ("CSV files", "*.csv"), ("All files", "*.*")]
         )
         
         if file_path:
-            # Create and show progress dialog for file loading
-            self.create_progress_dialog("Loading Data", "Loading raw data file...")
-            
-            # Start file loading in a separate thread
-            threading.Thread(target=lambda: self.load_file_thread(file_path), daemon=True).start()
-    
-    def load_file_thread(self, file_path):
-        try:
-            self.status_var.set(f"Loading data from {os.path.basename(file_path)}...")
-            
-            # Load data using Dataloader
-            self.zoodata_dl = Dataloader.read_file(file_path)
-            self.imu_data = np.array(self.zoodata_dl.raw_data)
-            self.current_file_path = file_path
+            self.stop_following()
             
-            # Calculate IMU data averages
-            self.update_imu_data_avg()
+            # A new file supersedes anything still queued for the previous one
+            self.jobs.cancel_all()
             
-            # Update UI from main thread
-            self.root.after(0, lambda: self.file_load_complete(file_path))
+            # Create and show progress dialog, then load the file on the background worker
+            self.create_progress_dialog("Loading Data", "Loading raw data file...", "load")
+            self.status_var.set(f"Loading data from {os.path.basename(file_path)}...")
+            use_cache, metric = self.use_cache, self.activity_metric
+            self.jobs.submit("load", lambda token: self.load_file_job(file_path, use_cache, metric, token),
+                             on_done=lambda zoodata_dl: self.file_load_complete(file_path, zoodata_dl),
+                             on_error=lambda e: self.show_load_error(str(e)),
+                             on_progress=self.update_progress,
+                             on_cancelled=lambda: self.job_cancelled("Loading cancelled"))
+    
+    @staticmethod
+    def load_file_job(file_path, use_cache, metric, token):
+        with span('job:load'):
+            # Runs on the job worker: load data using Dataloader, reporting progress per chunk
+            zoodata_dl = Dataloader.read_file(file_path, use_cache=use_cache, progress=token.progress)
             
-        except Exception as e:
-            # Show error message from main thread
-            self.root.after(0, lambda: self.show_load_error(str(e)))
+            # Compute the activity here so plotting on the main loop does not have to
+            zoodata_dl.activity(metric)
+            return zoodata_dl
             
-    def file_load_complete(self, file_path):
-        # Close progress dialog
-        if self.progress_dialog:
-            self.progress_dialog.destroy()
-            self.progress_dialog = None
+    def file_load_complete(self, file_path, zoodata_dl):
+        self.close_progress_dialog()
+        
+        self.set_full_data(zoodata_dl)
+        self.current_file_path = file_path
+        self.update_imu_data_avg()
         
         # Update time display
         self.update_time_display()
@@ -622,13 +850,16 @@ TIPS:
         # Update window title
         self.root.title(f"Enrichment Tracking Data Processor - {os.path.basename(file_path)}")
         
-        # Enable buttons
-        self.process_button.config(state=tk.NORMAL)
+        # Enable buttons (processing and cropping need timestamps)
+        timestamp_state = tk.NORMAL if self.zoodata_dl.has_timestamps else tk.DISABLED
+        self.process_button.config(state=timestamp_state)
         self.save_raw_button.config(state=tk.NORMAL)
         self.raw_radio.config(state=tk.NORMAL)
-        self.update_range_button.config(state=tk.NORMAL)
+        self.sensitivity_radio.config(state=timestamp_state)
+        self.update_range_button.config(state=timestamp_state)
+        self.reset_range_button.config(state=timestamp_state)
         
-        self.status_var.set(f"Data loaded successfully. Showing raw data from {os.path.basename(file_path)}")
+        self.set_status(f"Data loaded successfully. Showing raw data from {os.path.basename(file_path)}", "job:load")
         
         # Auto-save raw data if enabled
         if self.auto_save_raw:
@@ -637,31 +868,156 @@ TIPS:
         # Show success message
         messagebox.showinfo("File Loaded", f"Data loaded successfully from {os.path.basename(file_path)}")
     
-    def show_load_error(self, error_msg):
-        # Close progress dialog
-        if self.progress_dialog:
-            self.progress_dialog.destroy()
-            self.progress_dialog = None
+    def start_following(self):
+        # A growing log file, or a serial/pseudo-terminal device streaming the logger's output
+        file_path = filedialog.askopenfilename(
+            title="Select Live Log File or Serial Device",
+            filetypes=[("Text files", "*.txt"), ("All files", "*.*")]
+        )
+        if not file_path:
+            return
+        
+        self.stop_following()
+        try:
+            self.follower = LogFollower(file_path)
+        except OSError as e:
+            messagebox.showerror("Error", f"Failed to follow {file_path}: {e}")
+            return
+        
+        self.live_processor = Processor(metric=self.activity_metric)
+        self.follow_generation = self.follower.generation
+        self.current_file_path = file_path
+        self.crop_windows = []
+        self.zoodata_dl = None
+        self.full_dl = None
+        self.processed_data = None
+        
+        self.file_label.config(text=f"{os.path.basename(file_path)} (live)")
+        self.root.title(f"Enrichment Tracking Data Processor - {os.path.basename(file_path)} (live)")
+        self.status_var.set(f"Following {os.path.basename(file_path)}, waiting for data...")
+        
+        # Live data is processed as it arrives, and is not cropped
+        self.process_button.config(state=tk.DISABLED)
+        self.update_range_button.config(state=tk.DISABLED)
+        self.reset_range_button.config(state=tk.DISABLED)
+        
+        self.refresh_following()
+    
+    def stop_following(self):
+        if self.follow_job is not None:
+            self.root.after_cancel(self.follow_job)
+            self.follow_job = None
+        if self.follower is not None:
+            self.follower.close()
+            self.follower = None
+            self.status_var.set("Stopped following the live log")
+    
+    def refresh_following(self):
+        # Parse only the bytes appended since the last refresh
+        try:
+            block = self.follower.poll()
+        except (OSError, ValueError) as e:
+            self.stop_following()
+            messagebox.showerror("Error", f"Failed to read the live log: {e}")
+            return
+        
+        # The log shrank (truncated or replaced) and is read again from its start: nothing
+        # computed from the earlier samples applies any more
+        if self.follower.generation != self.follow_generation:
+            self.follow_generation = self.follower.generation
+            self.live_processor = Processor(metric=self.activity_metric)
+            self.processor = None
+            self.processed_data = None
+            self.sensitivity_processor = None
+            self.plot_source = None
+            self.imu_pyramid = None
+            self.status_var.set(f"{os.path.basename(self.current_file_path)} was truncated or replaced, "
+                                f"reading it again from the start")
+        
+        if len(block):
+            # Only the new samples are added to the activity, the sample times and the plot summary
+            first_data = self.zoodata_dl is None
+            changed_from = self.follower.update_activity(self.activity_metric)
+            self.set_full_data(self.follower.dataloader())
+            self.update_imu_data_avg(changed_from)
             
+            if self.zoodata_dl.has_timestamps:
+                # Fold the new samples into the per-minute aggregates (rebuilt if the metric changed,
+                # and every time with smoothing, whose windows span the blocks)
+                if self.live_processor.metric != self.activity_metric or self.activity_smoothing is not None:
+                    self.live_processor = Processor(self.zoodata_dl, self.activity_metric, self.activity_smoothing)
+                    self.live_processor.compute_minute_aggregates()
+                else:
+                    self.live_processor.update_aggregates(block)
+                self.live_processor.zoodata_dl = self.zoodata_dl
+                
+                try:
+                    threshold = float(self.threshold_var.get())
+                except ValueError:
+                    threshold = self.threshold_value
+                self.processed_data = self.live_processor.active_minutes_per_hour(threshold)
+                self.live_processor.result_with_counts = self.processed_data
+                self.processor = self.live_processor
+                
+                self.end_time = self.zoodata_dl.get_last_timestamp()
+                self.end_time_label.config(text=f"End Time: {int(self.end_time[0])}/{int(self.end_time[1]):02d}/"
+                                                 f"{int(self.end_time[2]):02d} {int(self.end_time[3]):02d}:{int(self.end_time[4]):02d}")
+            
+            if first_data:
+                self.update_time_display()
+                timestamp_state = tk.NORMAL if self.zoodata_dl.has_timestamps else tk.DISABLED
+                self.save_raw_button.config(state=tk.NORMAL)
+                self.save_processed_button.config(state=timestamp_state)
+                self.raw_radio.config(state=tk.NORMAL)
+                self.processed_radio.config(state=timestamp_state)
+                self.sensitivity_radio.config(state=timestamp_state)
+            
+            self.switch_view()
+            self.status_var.set(f"Following {os.path.basename(self.current_file_path)}: {len(self.zoodata_dl)} samples")
+        
+        self.follow_job = self.root.after(self.follow_interval_ms, self.refresh_following)
+    
+    def show_load_error(self, error_msg):
+        self.close_progress_dialog()
         messagebox.showerror("Error", f"Failed to load file: {error_msg}")
         self.status_var.set("Error loading data")
 
-    def create_progress_dialog(self, title="Processing", message="Please wait..."):
+    def create_progress_dialog(self, title="Processing", message="Please wait...", job_key=None):
+        self.close_progress_dialog()
+        
         # Create a progress dialog
         self.progress_dialog = tk.Toplevel(self.root)
         self.progress_dialog.title(title)
-        self.progress_dialog.geometry("300x100")
+        self.progress_dialog.geometry("300x130")
         self.progress_dialog.transient(self.root)
         self.progress_dialog.grab_set()
         
         # Center the dialog
         self.center_window(self.progress_dialog)
         
-        # Add progress bar and label
+        # Add progress bar (filled by the job's progress reports) and label
         tk.Label(self.progress_dialog, text=message).pack(pady=(10, 5))
-        self.progress_bar = ttk.Progressbar(self.progress_dialog, mode="indeterminate", length=250)
+        self.progress_bar = ttk.Progressbar(self.progress_dialog, mode="determinate", maximum=100, length=250)
         self.progress_bar.pack(pady=5)
-        self.progress_bar.start(10)  # Start the animation
+        
+        # Cancel stops the job at its next chunk
+        if job_key is not None:
+            tk.Button(self.progress_dialog, text="Cancel", command=lambda: self.jobs.cancel(job_key)).pack(pady=5)
+        
+    def update_progress(self, fraction):
+        if self.progress_dialog:
+            self.progress_bar['value'] = 100 * fraction
+        else:
+            self.status_var.set(f"Working... {100 * fraction:.0f}%")
+    
+    def close_progress_dialog(self):
+        if self.progress_dialog:
+            self.progress_dialog.destroy()
+            self.progress_dialog = None
+    
+    def job_cancelled(self, message):
+        self.close_progress_dialog()
+        self.status_var.set(message)
         
     def center_window(self, window):
         window.update_idletasks()
@@ -671,6 +1027,24 @@ TIPS:
         y = (window.winfo_screenheight() // 2) - (height // 2)
         window.geometry('{}x{}+{}+{}'.format(width, height, x, y))
     
+    def update_threshold(self):
+        # Redraw the threshold on the sensitivity view if it is shown, otherwise on the raw data
+        if self.view_var.get() == "sensitivity":
+            self.plot_threshold_sensitivity()
+        else:
+            self.view_var.set("raw")
+            self.plot_imu_data()
+        
+        # Re-process already processed data at the new threshold in the background. A newer
+        # request supersedes a pending one, so only the last of several quick changes runs
+        if self.processed_data is not None and self.follower is None:
+            try:
+                threshold = float(self.threshold_var.get())
+            except ValueError:
+                return
+            self.threshold_value = threshold
+            self.submit_processing(threshold, show_dialog=False)
+    
     def process_with_threshold(self):
         try:
             threshold = float(self.threshold_var.get())
@@ -685,52 +1059,51 @@ TIPS:
             return
         
         # Create and show progress dialog
-        self.create_progress_dialog(title="Processing Data", message="Processing data, please wait...")
-        
-        # Start processing in a separate thread to keep UI responsive
-        threading.Thread(target=lambda: self.process_data_thread(threshold), daemon=True).start()
+        self.create_progress_dialog(title="Processing Data", message="Processing data, please wait...", job_key="process")
+        self.submit_processing(threshold)
     
-    def process_data_thread(self, threshold):
-        try:
-            # Get base name of the file without extension for data_name
-            data_name = os.path.splitext(os.path.basename(self.current_file_path))[0]
-            
-            # Create processor instance and process the data
-            self.processor = Processor(self.zoodata_dl)  
-            self.processed_data = self.processor.process_imu_data(threshold)
-            
-            # Update UI from main thread
-            self.root.after(0, self.process_complete)
-            
-        except Exception as e:
-            # Show error message from main thread
-            self.root.after(0, lambda: self.show_process_error(str(e)))
+    def submit_processing(self, threshold, show_dialog=True):
+        # Process the data on the background worker, reusing the cached result if this file,
+        # time range and threshold were processed before
+        zoodata_dl, file_path = self.zoodata_dl, self.current_file_path
+        crop_windows, metric, smoothing = list(self.crop_windows), self.activity_metric, self.activity_smoothing
+        self.jobs.submit("process",
+                         lambda token: self.process_job(zoodata_dl, threshold, file_path, crop_windows,
+                                                        self.result_cache, metric, smoothing, token),
+                         on_done=lambda processor: self.process_complete(processor, show_dialog),
+                         on_error=lambda e: self.show_process_error(str(e)),
+                         on_progress=self.update_progress,
+                         on_cancelled=lambda: self.job_cancelled("Processing cancelled") if show_dialog else None)
     
-    def process_complete(self):
-        # Close progress dialog
-        if self.progress_dialog:
-            self.progress_dialog.destroy()
-            self.progress_dialog = None
+    @staticmethod
+    def process_job(zoodata_dl, threshold, file_path, crop_windows, result_cache, metric, smoothing, token):
+        with span('job:process', len(zoodata_dl)):
+            return process_cached(zoodata_dl, threshold, file_path, crop_windows, result_cache, metric,
+                                  token.progress, smoothing)
+    
+    def process_complete(self, processor, show_message=True):
+        self.close_progress_dialog()
+        self.processor = processor
+        self.processed_data = processor.result_with_counts
         
         # Enable save and view buttons
         self.save_processed_button.config(state=tk.NORMAL)
         self.processed_radio.config(state=tk.NORMAL)
         
-        # Show completion message
-        messagebox.showinfo("Processing Complete", "Data processing completed successfully!")
-        self.status_var.set("Data processing completed successfully")
+        self.set_status(f"Data processing completed successfully (threshold {processor.threshold})", "job:process")
+        if show_message:
+            # Show completion message
+            messagebox.showinfo("Processing Complete", "Data processing completed successfully!")
+        elif self.view_var.get() == "processed":
+            self.plot_processed_data()
     
     def show_process_error(self, error_msg):
-        # Close progress dialog
-        if self.progress_dialog:
-            self.progress_dialog.destroy()
-            self.progress_dialog = None
-            
+        self.close_progress_dialog()
         messagebox.showerror("Error", f"Failed to process data: {error_msg}")
         self.status_var.set("Error processing data")
     
     def save_raw_data(self, auto=False):
-        if self.imu_data is None:
+        if self.zoodata_dl is None:
             if not auto:  # Only show warning if not auto-saving
                 messagebox.showwarning("Warning", "No data loaded. Please open a data file first.")
             return
@@ -744,9 +1117,9 @@ TIPS:
             if not output_dir:
                 return
         
-        # Save raw data as CSV
+        # Save raw data as CSV (in the legacy 9-column layout, built only for saving)
         output_name = os.path.join(output_dir, f"raw_data_{os.path.splitext(os.path.basename(self.current_file_path))[0]}.csv")
-        pd.DataFrame(self.imu_data).to_csv(output_name, index=False, header=False)
+        pd.DataFrame(self.zoodata_dl.raw_data).to_csv(output_name, index=False, header=False)
         
         self.status_var.set(f"Raw data saved successfully to {output_name}")
         
@@ -765,8 +1138,18 @@ TIPS:
             
         data_name = os.path.splitext(os.path.basename(self.current_file_path))[0]
         
-        # Save processed data using the processor's save method
-        output_name = self.processor.save_results(output_dir, data_name)
+        # Ask which animal the data belongs to, for the comparison across animals
+        animal = simpledialog.askstring("Animal", "Animal this data file belongs to:",
+                                        initialvalue=animal_from_name(data_name), parent=self.root)
+        if not animal:
+            return
+        
+        # Save processed data using the processor's save method, also adding it to the results store
+        output_name = self.processor.save_results(output_dir, data_name, self.results_store, animal.strip().lower())
+        
+        # Save the interaction bouts at the same threshold next to it
+        self.processor.detect_bouts(self.threshold_value)
+        self.processor.save_bouts(output_dir, data_name)
         
         self.status_var.set(f"Data processed successfully. Output saved to {output_name}")
         messagebox.showinfo("Success", f"Data processed successfully.\nOutput saved to:\n{output_name}")
@@ -775,30 +1158,69 @@ TIPS:
         view_type = self.view_var.get()
         if view_type == "raw":
             self.plot_imu_data()
+        elif view_type == "sensitivity":
+            self.plot_threshold_sensitivity()
+        elif view_type == "compare":
+            self.plot_comparison()
         else:  # processed
             self.plot_processed_data()
     
+    @instrument.traced('draw:raw')
     def plot_imu_data(self):
         if self.imu_data_avg is not None:
             # Clear previous plot
             self.ax.clear()
             
-            # Create new plot
-            self.ax.plot(range(len(self.imu_data_avg)), self.imu_data_avg)
+            # Create new plot from a min/max-preserving level of detail rather than every sample
+            index, values = self.imu_pyramid.view(*self.plot_range, self.plot_points())
+            self.raw_line, = self.ax.plot(self.plot_x(index), values)
             
             # Add threshold line
             threshold = float(self.threshold_var.get())
             self.ax.axhline(y=threshold, color='r', linestyle='--', label=f'Threshold ({threshold})')
             
-            self.ax.set_xlabel('Time (ms)')
-            self.ax.set_ylabel('Acceleration (m/s^2)')
+            if self.plot_times is not None:
+                locator = mdates.AutoDateLocator()
+                self.ax.xaxis.set_major_locator(locator)
+                self.ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+                self.ax.set_xlabel('Time')
+            else:
+                self.ax.set_xlabel('Sample')
+            smoothing = f', {self.activity_smoothing}' if self.activity_smoothing is not None else ''
+            self.ax.set_ylabel(f'Activity ({self.activity_metric}{smoothing}, g)')
             self.ax.set_title('Raw Enrichment Device Tracker Data')
             self.ax.grid(True)
             self.ax.legend()
             
+            # Refine the level of detail whenever the view is zoomed or panned
+            self.ax.callbacks.connect('xlim_changed', self.update_raw_plot_detail)
+            
             # Update canvas
             self.canvas.draw()
 
+    def plot_points(self):
+        # About two points per horizontal pixel of the plot area
+        return max(2 * int(self.ax.get_window_extent().width), 500)
+
+    def update_raw_plot_detail(self, ax):
+        if self.imu_pyramid is None or self.raw_line is None:
+            return
+        
+        # Redraw only the visible range at the resolution of the screen
+        start, stop = ax.get_xlim()
+        if self.plot_times is not None:
+            start = np.searchsorted(self.plot_times, (start - EPOCH_DATENUM) * 86400.0, side='left') - 1
+            stop = np.searchsorted(self.plot_times, (stop - EPOCH_DATENUM) * 86400.0, side='right') + 1
+        first, last = self.plot_range
+        index, values = self.imu_pyramid.view(max(np.floor(start), first), min(np.ceil(stop) + 1, last), self.plot_points())
+        self.raw_line.set_data(self.plot_x(index), values)
+        self.canvas.draw_idle()
+
+    def plot_x(self, index):
+        # x coordinates (matplotlib dates or sample numbers) of the given samples
+        return self.plot_times[index] / 86400.0 + EPOCH_DATENUM if self.plot_times is not None else index
+
+    @instrument.traced('draw:processed')
     def plot_processed_data(self):
         if self.processed_data is not None:
             # Clear previous plot
@@ -823,7 +1245,82 @@ TIPS:
             # Update canvas
             self.canvas.draw()
 
+    @instrument.traced('draw:sensitivity')
+    def plot_threshold_sensitivity(self):
+        if self.zoodata_dl is None or not self.zoodata_dl.has_timestamps:
+            return
+        
+        # Per-minute peaks are computed once per loaded/cropped dataset and reused for every threshold
+        if (self.sensitivity_processor is None or self.sensitivity_processor.zoodata_dl is not self.zoodata_dl or
+                self.sensitivity_processor.metric != self.activity_metric or
+                self.sensitivity_processor.smoothing != self.activity_smoothing):
+            self.sensitivity_processor = Processor(self.zoodata_dl, self.activity_metric, self.activity_smoothing)
+            self.sensitivity_processor.compute_minute_aggregates()
+        
+        minute_max = self.sensitivity_processor.minute_max
+        if len(minute_max) == 0:
+            return
+        
+        # Sweep thresholds across the range of per-minute peak activity
+        thresholds = np.linspace(min(0.0, minute_max.min()), minute_max.max(), 200)
+        table = self.sensitivity_processor.process_thresholds(thresholds)
+        total_minutes = table[:, 4:].sum(axis=0)
+        
+        # Clear previous plot
+        self.ax.clear()
+        
+        self.ax.plot(thresholds, total_minutes)
+        
+        # Mark the current threshold
+        threshold = float(self.threshold_var.get())
+        self.ax.axvline(x=threshold, color='r', linestyle='--', label=f'Threshold ({threshold})')
+        
+        self.ax.set_xlabel('Threshold')
+        self.ax.set_ylabel('Total minutes of interaction')
+        self.ax.set_title('Threshold Sensitivity')
+        self.ax.grid(True)
+        self.ax.legend()
+        
+        # Update canvas
+        self.canvas.draw()
+
         # Add helper methods for managing placeholder text
+    def plot_comparison(self):
+        # Query the stored results rather than re-processing any raw data
+        period = self.compare_period_var.get()
+        rows = self.results_store.minutes_per_period(period)
+        
+        self.ax.clear()
+        if not rows:
+            self.ax.text(0.5, 0.5, "No saved results yet: save processed data to compare animals",
+                         ha='center', va='center', transform=self.ax.transAxes)
+            self.canvas.draw()
+            return
+        
+        animals = sorted({animal for animal, _, _ in rows})
+        periods = sorted({label for _, label, _ in rows})
+        minutes = np.zeros((len(animals), len(periods)))
+        for animal, label, total in rows:
+            minutes[animals.index(animal), periods.index(label)] = total
+        
+        # One group of bars per period, one bar per animal
+        width = 0.8 / len(animals)
+        for i, animal in enumerate(animals):
+            self.ax.bar(np.arange(len(periods)) + (i - (len(animals) - 1) / 2) * width, minutes[i], width, label=animal)
+        
+        self.ax.set_xticks(range(len(periods)))
+        self.ax.set_xticklabels(periods, rotation=45, ha='right', fontsize=8)
+        self.ax.set_xlabel(period.capitalize())
+        self.ax.set_ylabel('Minutes of interaction')
+        self.ax.set_title(f'Minutes of interaction per {period} by animal')
+        self.ax.legend()
+        plt.tight_layout()
+        self.canvas.draw()
+    
+    def compare_period_changed(self, event):
+        self.view_var.set("compare")
+        self.plot_comparison()
+    
     def clear_placeholder(self, event, placeholder):
         entry = event.widget
         if entry.get() == placeholder:
@@ -839,4 +1336,7 @@ TIPS:
 if __name__ == "__main__":
     root = tk.Tk()
     app = IMUDataVisualizerApp(root)
-    root.mainloop()
\ No newline at end of file
+    root.mainloop()
+    
+    # Stop any running job at its next chunk rather than waiting for it to finish
+    app.jobs.shutdown()
\ No newline at end of file
@@ -0,0 +1,303 @@
+import os
+import stat
+from typing import Dict, List, Optional
+
+import numpy as np
+from numpy.typing import NDArray
+
+from activity import HIGHPASS_WINDOW
+from dataloader import COLUMNS, Dataloader, LogLayout, to_epoch_seconds
+
+# Largest number of bytes read from the log per poll
+READ_BYTES = 1 << 20
+
+# Initial number of samples the growing buffers can hold
+INITIAL_CAPACITY = 1 << 16
+
+
+def _grown(buffer: NDArray, needed: int) -> NDArray:
+    # Growing buffers double their capacity when full, so appending stays amortized O(1) per sample
+    if needed <= len(buffer):
+        return buffer
+    return np.resize(buffer, (max(2 * len(buffer), needed),) + buffer.shape[1:])
+
+
+class LogFollower:
+    """
+    Follow mode for a log that is still being written:
+        -  `path` is either a regular file that grows (tail -f) or a serial/pseudo-terminal
+           device streaming the logger's output (configure the port, e.g. with stty, beforehand)
+        -  poll() parses only the bytes appended since the previous call and returns the new
+           samples as normalized Dataloader rows, ready for Processor.update_aggregates
+        -  dataloader() returns a Dataloader over every sample received so far, without copying;
+           its sample times, monotonicity and the activity of the metrics kept up to date with
+           update_activity() are extended as samples arrive, so each poll costs only the new samples
+        -  A file that shrinks (truncated or replaced) is read again from its start, dropping the
+           samples received so far; `generation` counts these restarts, so callers can drop
+           anything they built from the earlier samples
+    """
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+        # Detected from the first complete line
+        self.layout: Optional[LogLayout] = None
+
+        # A regular file is read from its start; a stream is joined mid-line, so the
+        # bytes before its first line break are dropped
+        self._is_file = stat.S_ISREG(os.stat(path).st_mode)
+        if self._is_file:
+            self._fd = os.open(path, os.O_RDONLY)
+        else:
+            self._fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK | getattr(os, 'O_NOCTTY', 0))
+        self._offset = 0
+        self._synced = self._is_file
+
+        # Bytes after the last line break, completed by a later poll
+        self._partial = b''
+
+        # Incremented every time the samples received so far are dropped
+        self.generation = 0
+
+        self._clear_samples()
+
+    def _clear_samples(self) -> None:
+        # Growing buffers of the samples received so far (capacity doubles when full)
+        self._length = 0
+        self._timestamps = np.empty(INITIAL_CAPACITY, dtype=np.int64)
+        self._xyz = np.empty((INITIAL_CAPACITY, 3), dtype=np.float32)
+        self._decimals: Optional[int] = 0
+        self._is_monotonic = True
+
+        # Sample times (see Dataloader.sample_times), from the runs of samples sharing a second
+        # and a histogram of the lengths of the runs between the first and the last, whose
+        # median is the typical number of samples per second
+        self._sample_times = np.empty(INITIAL_CAPACITY, dtype=np.float64)
+        self._run_starts = np.empty(INITIAL_CAPACITY, dtype=np.int64)
+        self._runs = 0
+        self._run_lengths = np.zeros(0, dtype=np.int64)
+
+        # Activity signal per metric, and the number of samples it covers
+        self._activity: Dict[str, NDArray] = {}
+        self._activity_length: Dict[str, int] = {}
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self) -> 'LogFollower':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._length
+
+    def _read_new_bytes(self) -> bytes:
+        if self._is_file:
+            # A log replaced by another file (rotated, or a new log moved over it) is reopened;
+            # while no file is at the path yet, the replaced one is still read
+            try:
+                current = os.stat(self.path)
+            except FileNotFoundError:
+                current = None
+            opened = os.fstat(self._fd)
+            if current is not None and (current.st_ino, current.st_dev) != (opened.st_ino, opened.st_dev):
+                os.close(self._fd)
+                self._fd = os.open(self.path, os.O_RDONLY)
+                self._reset()
+
+            # A file that shrank was truncated: start over from its beginning
+            elif opened.st_size < self._offset:
+                self._reset()
+            data = os.pread(self._fd, READ_BYTES, self._offset)
+            self._offset += len(data)
+            return data
+
+        chunks = []
+        try:
+            while True:
+                chunk = os.read(self._fd, READ_BYTES)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+        except (BlockingIOError, InterruptedError):
+            pass
+        except OSError:
+            # A pseudo-terminal whose writer has closed reports EIO
+            pass
+        return b''.join(chunks)
+
+    def _reset(self) -> None:
+        self._offset = 0
+        self._partial = b''
+        self._clear_samples()
+        self.layout = None
+        self.generation += 1
+
+    def poll(self) -> NDArray[np.float64]:
+        """
+        Parse the complete lines appended since the previous poll. Returns the new
+        samples as normalized (year, month, day, hour, minute, second, x, y, z) rows.
+        """
+        # Read first: a restart drops the partial line of the earlier file
+        new_bytes = self._read_new_bytes()
+        data = self._partial + new_bytes
+
+        # Keep the unterminated last line for the next poll
+        end = data.rfind(b'\n') + 1
+        self._partial = data[end:]
+        text = data[:end].decode('ascii', errors='replace')
+        if not self._synced:
+            if not text:
+                return np.empty((0, len(COLUMNS)))
+            text = text.split('\n', 1)[1]
+            self._synced = True
+
+        lines = [line for line in text.splitlines() if line.strip(' \t\r\x00')]
+        if self.layout is None:
+            if not lines:
+                return np.empty((0, len(COLUMNS)))
+            self.layout = Dataloader.layout_from_line(lines[0].replace('\x00', ''), self.path)
+            if self.layout.header:
+                lines = lines[1:]
+
+        records = self._decode(lines)
+        block = Dataloader._normalize(records, self.layout)
+        self._append(block)
+        return block
+
+    def _decode(self, lines: List[str]) -> NDArray[np.float64]:
+        if not lines:
+            return np.empty((0, self.layout.n_fields))
+        try:
+            records = np.loadtxt(lines, dtype=np.float64, ndmin=2)
+        except ValueError:
+            return Dataloader._decode_lines_tolerant(lines, self.layout, self.path)
+        if records.shape[1] != self.layout.n_fields:
+            return Dataloader._decode_lines_tolerant(lines, self.layout, self.path)
+        return records
+
+    def _append(self, block: NDArray[np.float64]) -> None:
+        n = len(block)
+        if n == 0:
+            return
+
+        self._timestamps = _grown(self._timestamps, self._length + n)
+        self._xyz = _grown(self._xyz, self._length + n)
+
+        old_length = self._length
+        new = slice(self._length, self._length + n)
+        if self.layout.name == 'timestamped':
+            self._timestamps[new] = to_epoch_seconds(block[:, :6])
+        self._xyz[new] = block[:, -3:]
+        self._length += n
+
+        if self.layout.name == 'timestamped':
+            timestamps = self._timestamps[max(old_length - 1, 0):self._length]
+            self._is_monotonic = self._is_monotonic and bool(np.all(timestamps[1:] >= timestamps[:-1]))
+            self._update_sample_times(old_length)
+
+        # Precision of the values received so far (None once any value has more decimals)
+        if self._decimals is not None:
+            decimals = Dataloader._count_decimals(block[:, -3:])
+            self._decimals = None if decimals is None else max(self._decimals, decimals)
+
+    def _update_sample_times(self, old_length: int) -> None:
+        """
+        Extend the sample times over the samples appended after `old_length`: only the last
+        second received before (which may have grown), the new seconds and the first second
+        (spaced at the typical rate, which may have changed) are computed again.
+        """
+        timestamps = self._timestamps
+        block = timestamps[old_length:self._length]
+        before = (timestamps[old_length - 1:self._length - 1] if old_length else
+                  np.concatenate(([block[0] - 1], block[:-1])))
+        starts = old_length + np.flatnonzero(block != before)
+
+        old_runs = self._runs
+        self._run_starts = _grown(self._run_starts, self._runs + len(starts) + 1)
+        self._run_starts[self._runs:self._runs + len(starts)] = starts
+        self._runs += len(starts)
+
+        # Runs that are now between the first and the last have their final length
+        lengths = np.diff(self._run_starts[max(old_runs - 1, 1):self._runs])
+        if len(lengths):
+            counts = np.bincount(lengths, minlength=len(self._run_lengths))
+            counts[:len(self._run_lengths)] += self._run_lengths
+            self._run_lengths = counts
+
+        self._sample_times = _grown(self._sample_times, self._length)
+        self._spread_runs(max(old_runs - 1, 0), self._runs)
+        if self._runs > 2 and old_runs > 1:
+            self._spread_runs(0, 1)
+
+    def _typical_run_length(self) -> float:
+        # Median of the lengths of the runs between the first and the last, from their histogram
+        cumulative = np.cumsum(self._run_lengths)
+        count = int(cumulative[-1])
+        low = np.searchsorted(cumulative, (count - 1) // 2, side='right')
+        high = np.searchsorted(cumulative, count // 2, side='right')
+        return (low + high) / 2
+
+    def _spread_runs(self, first_run: int, end_run: int) -> None:
+        # Same spacing as Dataloader._spread_within_seconds, for the runs [first_run, end_run)
+        self._run_starts[self._runs] = self._length
+        starts = self._run_starts[first_run:end_run]
+        lengths = np.diff(self._run_starts[first_run:end_run + 1])
+
+        spacing = lengths.astype(np.float64)
+        offset = np.zeros(len(starts))
+        if self._runs > 2:
+            typical = self._typical_run_length()
+            if first_run == 0:
+                spacing[0] = max(lengths[0], typical)
+                offset[0] = spacing[0] - lengths[0]
+            if end_run == self._runs:
+                spacing[-1] = max(lengths[-1], typical)
+
+        run = np.repeat(np.arange(len(starts)), lengths)
+        samples = slice(starts[0], starts[0] + len(run))
+        rank = np.arange(samples.start, samples.stop) - starts[run]
+        self._sample_times[samples] = self._timestamps[samples] + (rank + offset[run]) / spacing[run]
+
+    def update_activity(self, metric: str) -> int:
+        """
+        Extend the activity signal of `metric` (see activity.METRICS) over the samples received
+        since the previous call, and include it in the Dataloaders returned from then on. Returns
+        the index of the first sample whose activity changed: the 'highpass' moving average also
+        changes the samples just before the new ones.
+        """
+        done = self._activity_length.get(metric, 0)
+        if done == self._length:
+            return done
+
+        # Enough samples before the changed ones for their moving average to be complete
+        first = max(done - HIGHPASS_WINDOW, 0) if metric == 'highpass' else done
+        context = max(first - HIGHPASS_WINDOW, 0) if metric == 'highpass' else first
+
+        window = Dataloader(list(COLUMNS), layout='xyz', xyz=self._xyz[context:self._length], decimals=self._decimals)
+        activity = window.activity(metric)
+        if metric not in self._activity:
+            self._activity[metric] = np.empty(len(self._xyz), dtype=activity.dtype)
+        self._activity[metric] = _grown(self._activity[metric], self._length)
+        self._activity[metric][first:self._length] = activity[first - context:]
+        self._activity_length[metric] = self._length
+        return first
+
+    def dataloader(self) -> Dataloader:
+        """
+        Dataloader over every sample received so far (views of the growing buffers).
+        """
+        layout = self.layout.name if self.layout is not None else 'timestamped'
+        timestamps = self._timestamps[:self._length] if layout == 'timestamped' else None
+        dl = Dataloader(list(COLUMNS), layout=layout, timestamps=timestamps,
+                        xyz=self._xyz[:self._length], decimals=self._decimals)
+        if layout == 'timestamped':
+            dl._is_monotonic = self._is_monotonic
+            dl._sample_times = self._sample_times[:self._length]
+        for metric, activity in self._activity.items():
+            if self._activity_length[metric] == self._length:
+                dl._activity[metric] = activity[:self._length]
+        return dl
@@ -0,0 +1,248 @@
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Optional
+
+# Largest number of spans kept (the oldest are dropped first)
+MAX_SPANS = 100_000
+
+# Set to 1 to record spans from the start (e.g. for batch runs), or to 'memory' to also trace allocations
+ENV_VARIABLE = 'IMU_TRACE'
+
+
+class SpanRecord(NamedTuple):
+    """
+    One timed stage: when it started (seconds, perf_counter clock), how long it took, the
+    number of rows it handled and the peak memory it allocated (bytes, when memory is traced).
+    """
+    id: int
+    parent: Optional[int]
+    name: str
+    thread: str
+    start: float
+    duration: float
+    rows: Optional[int]
+    allocated: Optional[int]
+
+
+class _NullSpan:
+    # Shared by every span while recording is disabled, so a disabled span costs one call
+    rows = None
+
+    def __enter__(self) -> '_NullSpan':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+_enabled = False
+_trace_memory = False
+_spans: Deque[SpanRecord] = deque(maxlen=MAX_SPANS)
+_ids = itertools.count()
+_local = threading.local()
+
+
+class _Span:
+    def __init__(self, name: str, rows: Optional[int]) -> None:
+        self.name = name
+        self.rows = rows
+
+    def __enter__(self) -> '_Span':
+        stack = _stack()
+        self.id = next(_ids)
+        self.parent = stack[-1].id if stack else None
+        stack.append(self)
+
+        # Peak memory of the span: traced from its own start, and raised by its children's peaks
+        self.memory_start = self.peak = None
+        if _trace_memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            if len(stack) > 1 and stack[-2].peak is not None:
+                stack[-2].peak = max(stack[-2].peak, peak)
+            self.memory_start = self.peak = current
+            tracemalloc.reset_peak()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        duration = time.perf_counter() - self.start
+        stack = _stack()
+        stack.pop()
+
+        allocated = None
+        if self.memory_start is not None and tracemalloc.is_tracing():
+            self.peak = max(self.peak, tracemalloc.get_traced_memory()[1])
+            allocated = self.peak - self.memory_start
+            if stack and stack[-1].peak is not None:
+                stack[-1].peak = max(stack[-1].peak, self.peak)
+
+        _spans.append(SpanRecord(self.id, self.parent, self.name, threading.current_thread().name,
+                                 self.start, duration, self.rows, allocated))
+
+
+def _stack() -> List[_Span]:
+    if not hasattr(_local, 'stack'):
+        _local.stack = []
+    return _local.stack
+
+
+def enable(trace_memory: bool = False) -> None:
+    """
+    Start recording spans, with the memory allocated in each if `trace_memory`
+    (tracemalloc makes every allocation noticeably slower).
+    """
+    global _enabled, _trace_memory
+    _enabled = True
+    _trace_memory = trace_memory
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable() -> None:
+    global _enabled, _trace_memory
+    _enabled = False
+    if _trace_memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _trace_memory = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def clear() -> None:
+    _spans.clear()
+
+
+def span(name: str, rows: Optional[int] = None):
+    """
+    Context manager timing the stage `name`. Spans opened inside it on the same thread
+    are recorded as its children. The number of rows can also be set on the span later:
+        with span('parse') as s:
+            ...
+            s.rows = len(records)
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _Span(name, rows)
+
+
+def traced(name: str) -> Callable:
+    """
+    Decorator recording every call of a function as a span, with the length of its
+    result (when it has one) as the number of rows.
+    """
+    def decorator(function: Callable) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with _Span(name, None) as s:
+                result = function(*args, **kwargs)
+                if hasattr(result, '__len__') and not isinstance(result, str):
+                    s.rows = len(result)
+                return result
+        return wrapper
+    return decorator
+
+
+def spans() -> List[SpanRecord]:
+    return list(_spans)
+
+
+def add_spans(records: List[SpanRecord], thread: Optional[str] = None) -> None:
+    """
+    Add spans recorded in another process (e.g. returned by a worker) to this one's. They
+    get new ids, so they cannot collide with the ids of this process, and are filed under
+    `thread` if given.
+    """
+    ids = {record.id: next(_ids) for record in records}
+    for record in records:
+        _spans.append(record._replace(id=ids[record.id], parent=ids.get(record.parent),
+                                      thread=thread or record.thread))
+
+
+def breakdown(name: Optional[str] = None, records: Optional[List[SpanRecord]] = None) -> List[SpanRecord]:
+    """
+    The most recent top-level span (named `name`, if given) followed by its direct children, in order.
+    """
+    records = spans() if records is None else records
+    roots = [record for record in records if record.parent is None and name in (None, record.name)]
+    if not roots:
+        return []
+    root = roots[-1]
+    return [root] + sorted((record for record in records if record.parent == root.id), key=lambda r: r.start)
+
+
+def format_breakdown(name: Optional[str] = None, records: Optional[List[SpanRecord]] = None) -> str:
+    """
+    One line summary of the most recent top-level span (see breakdown), e.g.
+    "read_file 1.20 s: parse 0.95 s, compact 0.20 s, save_cache 0.05 s".
+    """
+    stages = breakdown(name, records)
+    if not stages:
+        return ''
+    root, children = stages[0], stages[1:]
+    text = f"{root.name} {root.duration:.2f} s"
+    if children:
+        text += ': ' + ', '.join(f"{child.name} {child.duration:.2f} s" for child in children)
+    return text
+
+
+def summary(records: Optional[List[SpanRecord]] = None) -> List[Dict[str, Any]]:
+    """
+    Totals per span name (calls, seconds, rows and largest allocation), slowest first.
+    """
+    totals: Dict[str, Dict[str, Any]] = {}
+    for record in (spans() if records is None else records):
+        total = totals.setdefault(record.name, {'name': record.name, 'calls': 0, 'seconds': 0.0,
+                                                'rows': 0, 'allocated': None})
+        total['calls'] += 1
+        total['seconds'] += record.duration
+        total['rows'] += record.rows or 0
+        if record.allocated is not None:
+            total['allocated'] = max(total['allocated'] or 0, record.allocated)
+    return sorted(totals.values(), key=lambda total: total['seconds'], reverse=True)
+
+
+def format_summary(records: Optional[List[SpanRecord]] = None) -> str:
+    lines = [f"{'stage':32s} {'calls':>6s} {'total (s)':>10s} {'rows':>12s} {'peak (MB)':>10s}"]
+    for total in summary(records):
+        allocated = f"{total['allocated'] / 2 ** 20:10.1f}" if total['allocated'] is not None else f"{'-':>10s}"
+        lines.append(f"{total['name']:32s} {total['calls']:6d} {total['seconds']:10.4f} {total['rows']:12d} {allocated}")
+    return '\n'.join(lines)
+
+
+def export_trace(path: str, records: Optional[List[SpanRecord]] = None) -> None:
+    """
+    Write the spans as a Chrome trace event file, which chrome://tracing and
+    https://ui.perfetto.dev open as a timeline per thread.
+    """
+    records = spans() if records is None else records
+
+    # Trace viewers expect numeric thread ids, named by metadata events
+    threads = {name: tid for tid, name in enumerate(dict.fromkeys(record.thread for record in records))}
+    events = [{'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': tid, 'args': {'name': name}}
+              for name, tid in threads.items()]
+    for record in records:
+        args = {}
+        if record.rows is not None:
+            args['rows'] = record.rows
+        if record.allocated is not None:
+            args['allocated_bytes'] = record.allocated
+        events.append({'name': record.name, 'ph': 'X', 'pid': os.getpid(), 'tid': threads[record.thread],
+                       'ts': record.start * 1e6, 'dur': record.duration * 1e6, 'args': args})
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+if os.environ.get(ENV_VARIABLE):
+    enable(trace_memory=os.environ[ENV_VARIABLE] == 'memory')
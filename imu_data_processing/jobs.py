@@ -0,0 +1,121 @@
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+
+class JobCancelled(Exception):
+    """
+    Raised inside a job when its CancelToken has been cancelled.
+    """
+
+
+class CancelToken:
+    """
+    Shared between a job and the scheduler. The job passes `progress` as the progress
+    callback of Dataloader/Processor calls: it reports the fraction done and raises
+    JobCancelled at the next chunk once the job is cancelled.
+    """
+    def __init__(self, report: Optional[Callable[[float], None]] = None) -> None:
+        self._event = threading.Event()
+        self._report = report
+
+    def cancel(self) -> None:
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def check(self) -> None:
+        if self._event.is_set():
+            raise JobCancelled()
+
+    def progress(self, fraction: float) -> None:
+        self.check()
+        if self._report is not None:
+            self._report(fraction)
+
+
+class JobScheduler:
+    """
+    Runs the GUI's background jobs one at a time on a single worker thread:
+        -  Jobs never overlap, so they cannot race over the application's state; jobs return
+           their results and the callbacks (run on the Tk main loop) apply them
+        -  Submitting a job under a key cancels the earlier job with the same key, whether it
+           is still waiting (it never runs) or already running (it stops at its next chunk)
+        -  Progress reported from the worker is delivered to the main loop as well
+    """
+    def __init__(self, root, poll_ms: int = 50) -> None:
+        self.root = root
+        self.poll_ms = poll_ms
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+        # Latest token per key, and callbacks waiting to run on the main loop
+        self._tokens: Dict[str, CancelToken] = {}
+        self._callbacks: queue.Queue = queue.Queue()
+
+        self.root.after(self.poll_ms, self._run_callbacks)
+
+    def submit(self, key: str, job: Callable[[CancelToken], Any],
+               on_done: Optional[Callable[[Any], None]] = None,
+               on_error: Optional[Callable[[Exception], None]] = None,
+               on_progress: Optional[Callable[[float], None]] = None,
+               on_cancelled: Optional[Callable[[], None]] = None) -> CancelToken:
+        """
+        Queue `job(token)`. Its result is passed to on_done, or its exception to on_error;
+        on_cancelled runs if it is superseded or cancelled. All callbacks run on the main loop.
+        """
+        self.cancel(key)
+
+        def deliver(callback: Optional[Callable[..., None]], *args: Any, final: bool = True) -> None:
+            # A job cancelled after finishing (e.g. superseded while its result was queued)
+            # must not apply its result either
+            def run_callback() -> None:
+                if token.cancelled:
+                    if final and on_cancelled is not None:
+                        on_cancelled()
+                elif callback is not None:
+                    callback(*args)
+            self._callbacks.put(run_callback)
+
+        token = CancelToken((lambda fraction: deliver(on_progress, fraction, final=False)) if on_progress else None)
+        self._tokens[key] = token
+
+        def run() -> None:
+            try:
+                token.check()
+                result = job(token)
+                token.check()
+            except JobCancelled:
+                deliver(None)
+            except Exception as e:
+                deliver(on_error, e)
+            else:
+                deliver(on_done, result)
+
+        self._executor.submit(run)
+        return token
+
+    def cancel(self, key: str) -> None:
+        token = self._tokens.pop(key, None)
+        if token is not None:
+            token.cancel()
+
+    def cancel_all(self) -> None:
+        for key in list(self._tokens):
+            self.cancel(key)
+
+    def shutdown(self) -> None:
+        self.cancel_all()
+        self._executor.shutdown(wait=False)
+
+    def _run_callbacks(self) -> None:
+        # Tk is not thread-safe, so the worker hands every callback to the main loop through a queue
+        while True:
+            try:
+                callback = self._callbacks.get_nowait()
+            except queue.Empty:
+                break
+            callback()
+        self.root.after(self.poll_ms, self._run_callbacks)
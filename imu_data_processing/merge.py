@@ -0,0 +1,223 @@
+import argparse
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+from dataloader import COLUMNS, Dataloader, from_epoch_seconds
+
+
+class FileSpan(NamedTuple):
+    """
+    Time range covered by one input file (epoch seconds), and how many of its
+    records were dropped as duplicates of records in earlier files.
+    """
+    filename: str
+    first: int
+    last: int
+    rows: int
+    duplicates: int
+
+
+class Overlap(NamedTuple):
+    """
+    Time range (epoch seconds) covered by two input files.
+    """
+    first_file: str
+    second_file: str
+    start: int
+    end: int
+
+
+class MergeReport(NamedTuple):
+    files: List[FileSpan]
+    overlaps: List[Overlap]
+    gaps: NDArray[np.float64]
+
+
+# Sorted samples of one file or of an already merged group of files, with the index of the source file of each
+class _Run(NamedTuple):
+    timestamps: NDArray[np.int64]
+    xyz: NDArray[np.float32]
+    source: NDArray[np.int32]
+
+
+def load_files(filenames: List[str], workers: Optional[int] = None, use_cache: bool = True) -> List[Dataloader]:
+    """
+    Read several data files concurrently (parsing, hashing and cache reads release the GIL
+    for most of their time, so threads are enough and avoid copying the results between processes).
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(lambda filename: Dataloader.read_file(filename, use_cache=use_cache), filenames))
+
+
+def merge_files(filenames: List[str], max_gap: float = 2.0, workers: Optional[int] = None,
+                use_cache: bool = True) -> Tuple[Dataloader, MergeReport]:
+    """
+    Load several logs of the same deployment (card swaps, restarts, copies) concurrently
+    and merge them into one time-ordered Dataloader. Records repeated in overlapping
+    files are kept once. Also returns a report of the files, their overlaps and the
+    gaps longer than `max_gap` seconds in the merged data.
+    """
+    return merge_dataloaders(load_files(filenames, workers, use_cache), filenames, max_gap)
+
+
+def merge_dataloaders(dataloaders: List[Dataloader], names: List[str],
+                      max_gap: float = 2.0) -> Tuple[Dataloader, MergeReport]:
+    """
+    Merge Dataloaders (named `names` in the report) into one time-ordered Dataloader.
+    See merge_files.
+    """
+    if not dataloaders:
+        raise ValueError("No data files to merge")
+    for dl, name in zip(dataloaders, names):
+        if not dl.has_timestamps:
+            raise ValueError(f"Cannot merge {name}: it has no timestamps (x y z only)")
+
+    # Sorted run of every file; only files whose clock went backwards need sorting
+    runs = []
+    for index, dl in enumerate(dataloaders):
+        timestamps, xyz = dl.timestamps, dl.xyz
+        if not dl.is_monotonic:
+            order = np.argsort(timestamps, kind='stable')
+            timestamps, xyz = timestamps[order], xyz[order]
+        runs.append(_Run(np.asarray(timestamps), np.asarray(xyz), np.full(len(timestamps), index, dtype=np.int32)))
+
+    sorted_timestamps = [run.timestamps for run in runs]
+
+    # Earlier files first, so their records win over duplicates in later files
+    order = sorted(range(len(runs)), key=lambda i: (runs[i].timestamps[0] if len(runs[i].timestamps) else 0, i))
+    runs = [runs[i] for i in order]
+
+    # k-way merge as a balanced tree of pairwise merges: O(n log k) work
+    while len(runs) > 1:
+        runs = [_merge_pair(runs[i], runs[i + 1]) if i + 1 < len(runs) else runs[i]
+                for i in range(0, len(runs), 2)]
+    merged = runs[0]
+
+    decimals = [dl.decimals for dl in dataloaders]
+    merged_dl = Dataloader(list(COLUMNS), layout='timestamped', timestamps=merged.timestamps, xyz=merged.xyz,
+                           decimals=None if None in decimals else max(decimals))
+
+    # Per-file spans, with the duplicates counted from the files' surviving records
+    kept = np.bincount(merged.source, minlength=len(dataloaders))
+    files = [FileSpan(name, int(dl.timestamps.min()) if len(dl) else 0, int(dl.timestamps.max()) if len(dl) else 0,
+                      len(dl), len(dl) - int(kept[index]))
+             for index, (dl, name) in enumerate(zip(dataloaders, names))]
+
+    # Time ranges covered by two files in which both actually have samples (the span of a
+    # file whose clock jumped can enclose another file without overlapping it)
+    overlaps = []
+    for i, a in enumerate(files):
+        for j in range(i + 1, len(files)):
+            b = files[j]
+            start, end = max(a.first, b.first), min(a.last, b.last)
+            if a.rows and b.rows and start <= end and all(
+                    np.searchsorted(timestamps, end, side='right') > np.searchsorted(timestamps, start, side='left')
+                    for timestamps in (sorted_timestamps[i], sorted_timestamps[j])):
+                overlaps.append(Overlap(a.filename, b.filename, start, end))
+
+    return merged_dl, MergeReport(files, overlaps, merged_dl.find_gaps(max_gap))
+
+
+def _merge_pair(a: _Run, b: _Run) -> _Run:
+    """
+    Merge two sorted runs, dropping the records of `b` that repeat records of `a`.
+    Records with equal timestamps keep `a`'s before `b`'s.
+    """
+    if len(a.timestamps) == 0 or len(b.timestamps) == 0 or a.timestamps[-1] < b.timestamps[0]:
+        return _Run(*(np.concatenate(pair) for pair in zip(a, b)))
+
+    b = _drop_duplicates(a, b)
+
+    # Final position of every record: its own index plus the number of records of the other run before it
+    a_positions = np.arange(len(a.timestamps)) + np.searchsorted(b.timestamps, a.timestamps, side='left')
+    b_positions = np.arange(len(b.timestamps)) + np.searchsorted(a.timestamps, b.timestamps, side='right')
+
+    merged = []
+    for a_values, b_values in zip(a, b):
+        values = np.empty((len(a_values) + len(b_values),) + a_values.shape[1:], dtype=a_values.dtype)
+        values[a_positions] = a_values
+        values[b_positions] = b_values
+        merged.append(values)
+    return _Run(*merged)
+
+
+def _drop_duplicates(a: _Run, b: _Run) -> _Run:
+    """
+    Remove from `b` the records (timestamp and x, y, z) that `a` already holds. A record
+    occurring several times is kept as often as the run with the most copies has it.
+    """
+    # Only the time range covered by both runs can hold duplicates
+    a_first = np.searchsorted(a.timestamps, b.timestamps[0], side='left')
+    a_last = np.searchsorted(a.timestamps, b.timestamps[-1], side='right')
+    b_first = np.searchsorted(b.timestamps, a.timestamps[0], side='left')
+    b_last = np.searchsorted(b.timestamps, a.timestamps[-1], side='right')
+    if a_first >= a_last or b_first >= b_last:
+        return b
+
+    # Identify every distinct record of the overlap by an integer key
+    records = np.zeros(a_last - a_first + b_last - b_first,
+                       dtype=[('epoch', np.int64), ('x', np.float32), ('y', np.float32), ('z', np.float32)])
+    for field, a_values, b_values in (('epoch', a.timestamps, b.timestamps), ('x', a.xyz[:, 0], b.xyz[:, 0]),
+                                      ('y', a.xyz[:, 1], b.xyz[:, 1]), ('z', a.xyz[:, 2], b.xyz[:, 2])):
+        records[field] = np.concatenate((a_values[a_first:a_last], b_values[b_first:b_last]))
+    _, keys = np.unique(records, return_inverse=True)
+    a_keys, b_keys = keys[:a_last - a_first], keys[a_last - a_first:]
+
+    # Occurrence number of each of b's records among the records of b with the same key
+    order = np.argsort(b_keys, kind='stable')
+    sorted_keys = b_keys[order]
+    group_starts = np.concatenate(([0], np.flatnonzero(sorted_keys[1:] != sorted_keys[:-1]) + 1))
+    group_sizes = np.diff(np.concatenate((group_starts, [len(sorted_keys)])))
+    occurrence = np.empty(len(b_keys), dtype=np.int64)
+    occurrence[order] = np.arange(len(b_keys)) - np.repeat(group_starts, group_sizes)
+
+    # Keep b's copies beyond the number of copies a already has
+    a_counts = np.bincount(a_keys, minlength=int(keys.max()) + 1)
+    keep = np.ones(len(b.timestamps), dtype=bool)
+    keep[b_first:b_last] = occurrence >= a_counts[b_keys]
+    return _Run(*(values[keep] for values in b))
+
+
+def format_time(epoch: int) -> str:
+    return '{:04d}-{:02d}-{:02d} {:02d}:{:02d}:{:02d}'.format(*from_epoch_seconds([epoch])[0])
+
+
+def print_report(report: MergeReport) -> None:
+    for span in report.files:
+        print(f"{os.path.basename(span.filename):40s} {format_time(span.first)} -> {format_time(span.last)}  "
+              f"{span.rows:9d} rows  {span.duplicates:9d} duplicates")
+    for overlap in report.overlaps:
+        print(f"Overlap: {os.path.basename(overlap.first_file)} and {os.path.basename(overlap.second_file)} "
+              f"from {format_time(overlap.start)} to {format_time(overlap.end)}")
+    for start, end in report.gaps:
+        print(f"Gap: {format_time(int(start))} -> {format_time(int(end))} ({end - start:.1f} s)")
+
+
+def save_merged(dl: Dataloader, output: str) -> None:
+    """
+    Write the merged samples as a headerless timestamped log that read_file can open.
+    """
+    decimals = dl.decimals if dl.decimals is not None else 6
+    np.savetxt(output, dl.raw_data, fmt=['%d'] * 6 + [f'%.{decimals}f'] * 3, delimiter=' ')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge the data files of one deployment into a single time-ordered log.")
+    parser.add_argument('inputs', nargs='+', help="Data files to merge")
+    parser.add_argument('-o', '--output', help="Write the merged log to this file")
+    parser.add_argument('--max-gap', type=float, default=2.0, help="Report gaps longer than this (seconds)")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="Number of files read concurrently")
+    parser.add_argument('--no-cache', action='store_true', help="Do not use the parsed-data cache")
+    args = parser.parse_args()
+
+    merged, report = merge_files(args.inputs, args.max_gap, args.workers, not args.no_cache)
+    print_report(report)
+    print(f"Merged {len(merged)} samples from {len(args.inputs)} file(s)")
+
+    if args.output:
+        save_merged(merged, args.output)
+        print(f"Saved merged log to {args.output}")
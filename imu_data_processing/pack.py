@@ -0,0 +1,100 @@
+import argparse
+import glob
+import os
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+
+from dataloader import PACKED_SUFFIX, Dataloader
+
+
+class PackResult(NamedTuple):
+    """
+    One converted log: its text and packed sizes (bytes) and the axes used.
+    """
+    source: str
+    output: str
+    rows: int
+    axes: str
+    text_bytes: int
+    packed_bytes: int
+
+
+def packed_path(filename: str, output_dir: Optional[str] = None) -> str:
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    return os.path.join(output_dir or os.path.dirname(filename), stem + PACKED_SUFFIX)
+
+
+def is_up_to_date(filename: str, output: str) -> bool:
+    """
+    A packed log is up to date if it is at least as recent as its text log.
+    """
+    return os.path.exists(output) and os.path.getmtime(output) >= os.path.getmtime(filename)
+
+
+def find_text_logs(paths: List[str]) -> List[str]:
+    """
+    Expand directories (all .txt files inside) and glob patterns into a sorted list of
+    text logs, leaving out packed logs.
+    """
+    files = set()
+    for path in paths:
+        if os.path.isdir(path):
+            files.update(f for f in glob.glob(os.path.join(path, '*')) if os.path.isfile(f) and f.lower().endswith('.txt'))
+        else:
+            files.update(f for f in glob.glob(path) if os.path.isfile(f))
+    return sorted(f for f in files if not Dataloader.is_packed(f))
+
+
+def pack_file(filename: str, output_dir: Optional[str] = None, axes: Optional[str] = None,
+              verify: bool = True) -> PackResult:
+    """
+    Convert a text log into a packed binary log (see dataloader.PACKED_SUFFIX). With `verify`,
+    the packed log is read back and compared with the text log, and removed if they differ.
+    """
+    dl = Dataloader.read_file(filename, use_cache=False)
+    output = packed_path(filename, output_dir)
+    axes = dl.write_packed(output, axes)
+
+    if verify:
+        packed = Dataloader.read_file(output)
+        same = (packed.layout == dl.layout and packed.decimals == dl.decimals and
+                np.array_equal(packed.raw_data, dl.raw_data, equal_nan=True))
+        if not same:
+            os.remove(output)
+            raise ValueError(f"{output} does not read back to the same samples as {filename}")
+
+    return PackResult(filename, output, len(dl), axes, os.path.getsize(filename), os.path.getsize(output))
+
+
+def pack_files(filenames: List[str], output_dir: Optional[str] = None, axes: Optional[str] = None,
+               verify: bool = True) -> List[PackResult]:
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    return [pack_file(filename, output_dir, axes, verify) for filename in filenames]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert text data files into packed binary logs that load without parsing.")
+    parser.add_argument('inputs', nargs='+', help="Data files, directories or glob patterns")
+    parser.add_argument('-o', '--output-dir', help="Write the packed logs here (default: next to each data file)")
+    parser.add_argument('--axes', choices=['int16', 'float32'], help="Storage of x, y and z (default: the smallest lossless)")
+    parser.add_argument('--no-verify', action='store_true', help="Do not read the packed logs back to check them")
+    parser.add_argument('-f', '--force', action='store_true', help="Repack logs whose packed copies are up to date")
+    args = parser.parse_args()
+
+    inputs = []
+    for filename in find_text_logs(args.inputs):
+        if not args.force and is_up_to_date(filename, packed_path(filename, args.output_dir)):
+            print(f"{os.path.basename(filename):40s} up to date")
+        else:
+            inputs.append(filename)
+    total_text = total_packed = 0
+    for result in pack_files(inputs, args.output_dir, args.axes, not args.no_verify):
+        print(f"{os.path.basename(result.source):40s} {result.rows:9d} rows  {result.axes:7s} "
+              f"{result.text_bytes:11d} -> {result.packed_bytes:11d} bytes  ({result.packed_bytes / result.text_bytes:.0%})")
+        total_text += result.text_bytes
+        total_packed += result.packed_bytes
+
+    if total_text:
+        print(f"Packed {len(inputs)} file(s): {total_text} -> {total_packed} bytes ({total_packed / total_text:.0%})")
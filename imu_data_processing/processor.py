@@ -2,99 +2,343 @@ import os
 import numpy as np
 import matplotlib.pyplot as plt
 from dataloader import *
+from activity import DEFAULT_METRIC, compute_activity, parse_smoothing, smooth
+from results_store import ResultsStore, animal_from_name
+from instrument import span, traced
+from rollup import Rollups, interval_table
 
 
 
+# Columns of the interaction bouts returned by Processor.detect_bouts (times in epoch seconds)
+BOUT_DTYPE = np.dtype([('start', np.float64), ('end', np.float64),
+                       ('duration', np.float64), ('peak', np.float64)])
+
+
+def group_max(keys, values):
+    """
+    Group values by integer key and return (unique sorted keys, max value per key).
+    """
+    if len(keys) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+    # Logs are written in time order, so sorting is usually skipped
+    if np.any(keys[1:] < keys[:-1]):
+        order = np.argsort(keys, kind='stable')
+        keys, values = keys[order], values[order]
+
+    starts = np.concatenate(([0], np.flatnonzero(keys[1:] != keys[:-1]) + 1))
+    return keys[starts], np.maximum.reduceat(values, starts)
+
 
 class Processor:
     """
     A class to process IMU data from a Zoodata Dataloader object.
     """
-    def __init__(self, zoodata_dl):
+    # Bump whenever a change to the processing code changes its results, so
+    # results cached by earlier versions are no longer used
+    ALGORITHM_VERSION = 2
+
+    def __init__(self, zoodata_dl=None, metric=DEFAULT_METRIC, smoothing=None):
         self.zoodata_dl = zoodata_dl
+
+        # Activity metric thresholded by the processing (see activity.METRICS), optionally
+        # smoothed over a rolling window first (e.g. 'min:3' or 'mean:1s', see activity.Smoothing)
+        self.metric = metric
+        self.smoothing = parse_smoothing(smoothing)
+        self.smoothed = None
         # self.output_dir = output_dir
         # self.data_name = data_name
         self.result_with_counts = None
+        self.threshold = None
+        self.bouts = None
+
+        # Minutes with any data in each hour of result_with_counts, so minutes lost to gaps
+        # can be told apart from minutes without interaction
+        self.data_minutes = None
+
+        # Running per-minute aggregates (minute key = epoch seconds // 60) used when
+        # a file is processed block by block
+        self.minute_keys = None
+        self.minute_max = None
+
+        # Second/minute/hour/day rollups of the whole Dataloader, from which any other
+        # resolution is derived (see rollup.Rollups)
+        self.rollups = None
+
+    @traced('update_aggregates')
+    def update_aggregates(self, block):
+        """
+        Fold a block of samples (normalized Dataloader rows) into the running
+        per-minute aggregates, so only one block needs to be in memory at a time.
+        """
+        if np.isnan(block[:, 0]).any():
+            raise ValueError("Cannot count minutes of interaction per hour: the data file has no timestamps")
+        if self.smoothing is not None:
+            raise ValueError("Smoothed activity cannot be processed block by block: process the whole file")
+
+        # Rollups built before no longer cover all the data
+        self.rollups = None
+
+        epoch = to_epoch_seconds(block[:, :6])
+        activity = compute_activity(block[:, -3:], self.metric)
+        keys, peaks = group_max(epoch // 60, activity)
+
+        if self.minute_keys is None or len(self.minute_keys) == 0:
+            self.minute_keys, self.minute_max = keys, peaks
+        elif len(keys) == 0:
+            return
+        elif keys[0] >= self.minute_keys[-1]:
+            # Appended data (a block of a file or a followed log): only the last
+            # minute so far can be shared, every later minute is new. The arrays are
+            # replaced rather than edited, as they may be shared with the rollups
+            if keys[0] == self.minute_keys[-1]:
+                peaks = np.concatenate(([max(self.minute_max[-1], peaks[0])], peaks[1:]))
+                self.minute_keys = np.concatenate((self.minute_keys[:-1], keys))
+                self.minute_max = np.concatenate((self.minute_max[:-1], peaks))
+            else:
+                self.minute_keys = np.concatenate((self.minute_keys, keys))
+                self.minute_max = np.concatenate((self.minute_max, peaks))
+        else:
+            # Out-of-order minutes (e.g. after an RTC reset): regroup the union
+            self.minute_keys, self.minute_max = group_max(np.concatenate((self.minute_keys, keys)),
+                                                          np.concatenate((self.minute_max, peaks)))
+
+    @traced('active_minutes_per_hour')
+    def active_minutes_per_hour(self, threshold):
+        """
+        Count, for every hour in the per-minute aggregates, the minutes whose
+        peak activity is above the threshold. `threshold` may also be a sequence
+        of thresholds, giving one count column per threshold.
+        """
+        thresholds = np.atleast_1d(np.asarray(threshold, dtype=np.float64))
+        if len(self.minute_keys) == 0:
+            return np.empty((0, 4 + len(thresholds)), dtype=int)
+
+        hour_keys = self.minute_keys // 60
+        starts = np.concatenate(([0], np.flatnonzero(hour_keys[1:] != hour_keys[:-1]) + 1))
+
+        # Compare every minute against all thresholds at once, then sum per hour
+        active = self.minute_max[:, np.newaxis] > thresholds[np.newaxis, :]
+        counts = np.add.reduceat(active.astype(np.int64), starts, axis=0)
+
+        hours = from_epoch_seconds(hour_keys[starts] * 3600)[:, :4]
+        return np.column_stack((hours, counts)).astype(int)
+
+    def minutes_with_data_per_hour(self):
+        """
+        Count, for every hour in the per-minute aggregates, the minutes that have any
+        data, so minutes lost to gaps can be told apart from minutes without interaction.
+        The rows are the hours of active_minutes_per_hour.
+        """
+        if self.minute_keys is None or len(self.minute_keys) == 0:
+            return np.empty((0, 5), dtype=int)
+
+        hour_keys, counts = np.unique(self.minute_keys // 60, return_counts=True)
+        hours = from_epoch_seconds(hour_keys * 3600)[:, :4]
+        return np.column_stack((hours, counts)).astype(int)
+
+    @traced('process_imu_data_chunks')
+    def process_imu_data_chunks(self, chunks, threshold):
+        """
+        Process a stream of blocks (e.g. from Dataloader.iter_chunks) with bounded memory.
+        Returns the same hour -> minutes of interaction table as process_imu_data.
+        """
+        for block in chunks:
+            self.update_aggregates(block)
+
+        if self.minute_keys is None:
+            raise ValueError("No data to process")
+
+        self.result_with_counts = self.active_minutes_per_hour(threshold)
+        self.data_minutes = self.minutes_with_data_per_hour()[:, 4]
+        self.threshold = threshold
+        return self.result_with_counts
     
-    def process_imu_data(self, threshold):
-        imu_data = np.array(self.zoodata_dl.raw_data)
-        imu_data_avg = []
-
-        for row in imu_data:
-            # avg = np.abs(np.mean(row[-3:]))
-            avg = (np.mean(row[-3:]))
-            imu_data_avg.append(avg)
-
-        self.imu_data_avg = np.array(imu_data_avg)
-
-        # ### Get average acceleration per interval of time
-        time = imu_data[:, :6]
-        imu_data_avg_time = np.column_stack((time, imu_data_avg))
-
-        # Get unique time stamps and their indices
-        unique_times, unique_indices = np.unique(imu_data_avg_time[:, :6], axis=0, return_inverse=True)
-
-        # Calculate the average acceleration for each unique time stamp
-        avg_acceleration = np.array([imu_data_avg_time[unique_indices == i, 6].mean() for i in range(len(unique_times))])
-
-        # Combine unique times with their corresponding average accelerations
-        result = np.column_stack((unique_times, avg_acceleration))
-        print(result.shape)
-
-        # Define threshold for significant acceleration
-        threshold = threshold
-
-        # Get time data (year, month, day, hour) and acceleration data
-        time_data = imu_data[:, :6]  # Time data (year, month, day, hour, minute, second)
-        accel_data = imu_data_avg    # Average acceleration data
-
-        # Combine time data with acceleration data
-        combined_data = np.column_stack((time_data, accel_data))
-
-        # Group by hour (year, month, day, hour)
-        hours = combined_data[:, :4]
-        unique_hours = np.unique(hours, axis=0)
-
-        # Count minutes with significant acceleration per hour
-        minutes_per_hour = []
-
-        for hour in unique_hours:
-            # Get all data for this hour
-            mask = np.all(combined_data[:, :4] == hour, axis=1)
-            hour_data = combined_data[mask]
-            
-            # Get unique minutes in this hour
-            unique_minutes = np.unique(hour_data[:, 4])
-            
-            # Count minutes with acceleration > threshold
-            minutes_above_threshold = 0
-            for minute in unique_minutes:
-                minute_mask = hour_data[:, 4] == minute
-                minute_data = hour_data[minute_mask]
-                if np.any(minute_data[:, 6] > threshold):
-                    minutes_above_threshold += 1
-            
-            # Store hour with count of minutes above threshold
-            minutes_per_hour.append(np.append(hour, minutes_above_threshold))
-
-        # Convert to numpy array
-        result_with_counts = np.array(minutes_per_hour)
-
-        # Save result as CSV
-        # Convert result_with_counts to integers before saving
-        result_with_counts = result_with_counts.astype(int)
-        print(result_with_counts)
+    def activity(self):
+        """
+        Activity of every sample of the Dataloader that the thresholds are compared against:
+        the metric, smoothed if the Processor has a smoothing. The smoothed signal is computed once.
+        """
+        activity = self.zoodata_dl.activity(self.metric)
+        if self.smoothing is None:
+            return activity
+
+        if self.smoothed is None or self.smoothed[0] is not activity:
+            with span('smooth', len(activity)):
+                times = self.zoodata_dl.sample_times if self.smoothing.seconds else None
+                self.smoothed = activity, smooth(activity, self.smoothing, times)
+        return self.smoothed[1]
+
+    @traced('minute_aggregates')
+    def compute_minute_aggregates(self, progress=None):
+        """
+        Compute the per-sample activity, its rollups and the peak activity per minute
+        of the Dataloader's data. These do not depend on the threshold, so they are
+        computed once and reused for every threshold and resolution. `progress`, if given, is
+        called with the fraction done after each step and each chunk of samples (it may raise to stop).
+        """
+        if not self.zoodata_dl.has_timestamps:
+            raise ValueError("Cannot count minutes of interaction per hour: the data file has no timestamps")
+
+        # Activity of every sample (the metric itself is shared with other users of the Dataloader)
+        self.imu_data_avg = self.activity()
+        if progress is not None:
+            progress(0.3)
+
+        # Activity per second, minute, hour and day; the minute peaks (keyed on epoch // 60)
+        # are what the thresholds are compared against. The samples are scanned in chunks,
+        # reporting progress (and so stopping if cancelled) after each
+        timestamps = self.zoodata_dl.timestamps
+        rollup_progress = (lambda fraction: progress(0.3 + 0.6 * fraction)) if progress is not None else None
+        with span('rollups', len(timestamps)):
+            self.rollups = Rollups(timestamps, self.imu_data_avg, progress=rollup_progress)
+        minutes = self.rollups.level(60)
+        self.minute_keys, self.minute_max = minutes.start // 60, minutes.peak
+        if progress is not None:
+            progress(0.9)
+
+    @traced('process_imu_data')
+    def process_imu_data(self, threshold, progress=None):
+        self.compute_minute_aggregates(progress)
+
+        # Count minutes with activity above the threshold per hour (epoch // 3600)
+        result_with_counts = self.active_minutes_per_hour(threshold)
+        if progress is not None:
+            progress(1.0)
+
         self.result_with_counts = result_with_counts
+        self.data_minutes = self.minutes_with_data_per_hour()[:, 4]
+        self.threshold = threshold
         return result_with_counts
+
+    def results_table(self):
+        """
+        result_with_counts with the minutes with data of each hour as a sixth column.
+        """
+        data_minutes = self.data_minutes
+        if data_minutes is None or len(data_minutes) != len(self.result_with_counts):
+            # Results folded in by hand (e.g. live following) from the current aggregates
+            data_minutes = self.minutes_with_data_per_hour()[:, 4]
+        return np.column_stack((self.result_with_counts, data_minutes)).astype(int)
+
+    @traced('process_thresholds')
+    def process_thresholds(self, thresholds):
+        """
+        Count minutes of interaction per hour for several thresholds in a single pass
+        over the data. Returns an array with columns
+        (year, month, day, hour, count for thresholds[0], count for thresholds[1], ...).
+        """
+        if self.minute_keys is None:
+            self.compute_minute_aggregates()
+
+        return self.active_minutes_per_hour(thresholds)
     
-    def save_results(self, output_dir, data_name):        
+    @traced('active_per_interval')
+    def active_per_interval(self, threshold, width=3600, unit=60, statistic='peak'):
+        """
+        Count, for every `width`-second interval (e.g. 900 for 15 minutes, 86400 for a day),
+        the `unit`-second periods whose peak (or mean) activity is above the threshold: minutes
+        of interaction per hour by default, or seconds of interaction per minute with width=60, unit=1.
+        Reuses the rollups of the data, so changing the resolution does not rescan the samples.
+        Returns (year, month, day, hour, minute, count) rows, the time being the interval start.
+        """
+        if self.rollups is None:
+            self.compute_minute_aggregates()
+
+        start, counts = self.rollups.active(width, threshold, unit, statistic)
+        return interval_table(start, counts)
+
+    def save_intervals(self, output_dir, data_name, threshold, width=3600, unit=60, statistic='peak'):
+        """
+        Save the counts of active_per_interval as <data_name>_<width>s_intervals.csv.
+        """
+        output_name = f'{output_dir}/{data_name}_{width}s_intervals.csv'
+        np.savetxt(output_name,
+                self.active_per_interval(threshold, width, unit, statistic),
+                delimiter=',',
+                fmt='%d',
+                header=f'Year,Month,Day,Hour,Minute,Active periods of {unit} s',
+                comments='')
+
+        return output_name
+
+    @traced('detect_bouts')
+    def detect_bouts(self, threshold, merge_gap=5.0, min_duration=1.0):
+        """
+        Find interaction bouts: runs of samples with activity above the threshold.
+        Bouts separated by at most `merge_gap` seconds are merged, and merged bouts
+        shorter than `min_duration` seconds are dropped. Returns a BOUT_DTYPE array.
+        """
+        if not self.zoodata_dl.has_timestamps:
+            raise ValueError("Cannot detect interaction bouts: the data file has no timestamps")
+
+        times = self.zoodata_dl.sample_times
+        activity = self.activity()
+        if not self.zoodata_dl.is_monotonic:
+            order = np.argsort(times, kind='stable')
+            times, activity = times[order], activity[order]
+
+        # Run-length encode the thresholded signal into [first, last] sample indices
+        active = np.concatenate(([False], activity > threshold, [False]))
+        edges = np.diff(active.astype(np.int8))
+        firsts = np.flatnonzero(edges == 1)
+        lasts = np.flatnonzero(edges == -1) - 1
+        if len(firsts) == 0:
+            self.bouts = np.empty(0, dtype=BOUT_DTYPE)
+            return self.bouts
+
+        # Peak of each run (the samples between runs are all below the threshold)
+        peaks = np.maximum.reduceat(activity, firsts)
+
+        # Merge runs separated by short gaps: a new bout starts after every longer gap
+        new_bout = np.concatenate(([True], times[firsts[1:]] - times[lasts[:-1]] > merge_gap))
+        bout_starts = np.flatnonzero(new_bout)
+        bout_ends = np.concatenate((bout_starts[1:], [len(firsts)])) - 1
+
+        bouts = np.empty(len(bout_starts), dtype=BOUT_DTYPE)
+        bouts['start'] = times[firsts[bout_starts]]
+        bouts['end'] = times[lasts[bout_ends]]
+        bouts['duration'] = bouts['end'] - bouts['start']
+        bouts['peak'] = np.maximum.reduceat(peaks, bout_starts)
+
+        self.bouts = bouts[bouts['duration'] >= min_duration]
+        return self.bouts
+
+    def save_bouts(self, output_dir, data_name):
+        # Format bout times as readable timestamps (millisecond resolution)
+        start = np.datetime_as_string((self.bouts['start'] * 1000).astype('datetime64[ms]'))
+        end = np.datetime_as_string((self.bouts['end'] * 1000).astype('datetime64[ms]'))
+
+        np.savetxt(f'{output_dir}/{data_name}_bouts.csv',
+                np.column_stack((start, end,
+                                 np.char.mod('%.3f', self.bouts['duration']),
+                                 np.char.mod('%.3f', self.bouts['peak']))),
+                delimiter=',',
+                fmt='%s',
+                header='Start,End,Duration (s),Peak Activity',
+                comments='')
+
+        return f'{output_dir}/{data_name}_bouts.csv'
+
+    @traced('save_results')
+    def save_results(self, output_dir, data_name, store=None, animal=None, device=''):
         np.savetxt(f'{output_dir}/{data_name}_enrichment_data.csv', 
-                self.result_with_counts, 
+                self.results_table(), 
                 delimiter=',', 
-                fmt='%d,%d,%d,%d,%d',
-                header='Year,Month,Day,Hour,Minutes of Interaction', 
+                fmt='%d,%d,%d,%d,%d,%d',
+                header='Year,Month,Day,Hour,Minutes of Interaction,Minutes with Data', 
                 comments='')
         
+        # Also append the table to the shared results store (a ResultsStore or its path), by
+        # default under the animal named in the data file name
+        if store is not None:
+            animal = animal or animal_from_name(data_name)
+            if isinstance(store, ResultsStore):
+                store.append(self.result_with_counts, data_name, animal, device, self.threshold, self.metric)
+            else:
+                with ResultsStore(store) as results_store:
+                    results_store.append(self.result_with_counts, data_name, animal, device, self.threshold, self.metric)
+        
         return f'{output_dir}/{data_name}_enrichment_data.csv'
 
 
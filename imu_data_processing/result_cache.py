@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+from activity import DEFAULT_METRIC, parse_smoothing
+from dataloader import Dataloader
+from processor import Processor
+
+# Default location and size bound of the processed-results cache
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'imu_data_processing', 'results')
+DEFAULT_MAX_BYTES = 100 * 1024 * 1024
+
+
+class ResultCache:
+    """
+    Persistent cache of processed enrichment tables:
+        -  Entries are keyed on the input file's content digest, the crop window(s),
+           the threshold, the activity metric (and its smoothing) and Processor.ALGORITHM_VERSION
+        -  Entries are stored as .npy files, bounded in total size with least-recently-used eviction
+    """
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+        # Digests of files already hashed in this session, keyed on (path, size, mtime)
+        self._digests: Dict[Tuple[str, int, int], str] = {}
+
+    def file_digest(self, filename: str) -> str:
+        stat = os.stat(filename)
+        stat_key = (os.path.abspath(filename), stat.st_size, stat.st_mtime_ns)
+        if stat_key not in self._digests:
+            self._digests[stat_key] = Dataloader.file_digest(filename)
+        return self._digests[stat_key]
+
+    def key(self, filename: str, crop_windows: Sequence[Tuple[Optional[str], Optional[str]]],
+            threshold: float, metric: str = DEFAULT_METRIC, smoothing: Optional[str] = None) -> str:
+        """
+        Cache key of the result of processing `filename`, cropped to each of
+        `crop_windows` in turn, with the given threshold and activity metric.
+        """
+        fields = [Processor.ALGORITHM_VERSION, self.file_digest(filename),
+                  [list(window) for window in crop_windows], float(threshold), metric]
+
+        # Unsmoothed results keep the keys they had before smoothing existed
+        smoothing = parse_smoothing(smoothing)
+        if smoothing is not None:
+            fields.append(str(smoothing))
+        return hashlib.sha256(json.dumps(fields).encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + '.npy')
+
+    def get(self, key: str) -> Optional[NDArray[np.int64]]:
+        path = self._path(key)
+        try:
+            result = np.load(path)
+        except (OSError, ValueError):
+            return None
+
+        # Mark the entry as recently used
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return result
+
+    def put(self, key: str, result: NDArray[np.int64]) -> None:
+        """
+        Store a result, then evict the least recently used entries beyond the size bound.
+        Failing to write the cache is not an error.
+        """
+        path = self._path(key)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_path, 'wb') as f:
+                np.save(f, result)
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+
+        self.evict()
+
+    def evict(self) -> None:
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.npy'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, name))
+
+        # Remove the least recently used entries first
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except OSError:
+                continue
+            total -= size
+
+    def clear(self) -> None:
+        """
+        Invalidate every cached result (e.g. after changing the processing code locally).
+        """
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.npy') or name.endswith('.tmp'):
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except OSError:
+                    pass
+
+
+def process_cached(zoodata_dl: Dataloader, threshold: float, filename: str,
+                   crop_windows: Sequence[Tuple[Optional[str], Optional[str]]] = (),
+                   cache: Optional[ResultCache] = None, metric: str = DEFAULT_METRIC,
+                   progress: Optional[Callable[[float], None]] = None,
+                   smoothing: Optional[str] = None) -> Processor:
+    """
+    Memoized Processor.process_imu_data: `zoodata_dl` must hold the data of `filename`
+    cropped to `crop_windows`. Returns a Processor whose result_with_counts and data_minutes are set.
+    """
+    cache = cache or ResultCache()
+    key = cache.key(filename, crop_windows, threshold, metric, smoothing)
+
+    processor = Processor(zoodata_dl, metric, smoothing)
+    # Entries hold the results table with the minutes with data as last column
+    table = cache.get(key)
+    if table is None or table.ndim != 2 or table.shape[1] != 6:
+        processor.process_imu_data(threshold, progress)
+        table = processor.results_table()
+        cache.put(key, table)
+    elif progress is not None:
+        progress(1.0)
+
+    processor.result_with_counts = table[:, :5]
+    processor.data_minutes = table[:, 5]
+    processor.threshold = threshold
+    return processor
@@ -0,0 +1,111 @@
+import os
+import re
+import sqlite3
+from typing import List, Optional, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+# Default location of the results shared by every processed file
+DEFAULT_STORE_PATH = os.path.join(os.path.expanduser('~'), '.local', 'share', 'imu_data_processing', 'results.sqlite')
+
+# Periods results can be compared over, as SQLite date expressions
+PERIODS = {
+    'hour': "date || ' ' || printf('%02d:00', hour)",
+    'day': "date",
+    'week': "strftime('%Y-W%W', date)",
+    'month': "strftime('%Y-%m', date)",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    animal TEXT NOT NULL,
+    device TEXT NOT NULL,
+    source TEXT NOT NULL,
+    date TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    minutes INTEGER NOT NULL,
+    threshold REAL,
+    metric TEXT,
+    PRIMARY KEY (animal, device, source, date, hour)
+);
+CREATE INDEX IF NOT EXISTS results_by_time ON results (animal, device, date, hour);
+"""
+
+
+def animal_from_name(data_name: str) -> str:
+    """
+    Guess the animal from a data file name such as 20250331_porcupine_10_46-13_28:
+    the first part of the name that is not a number. Falls back to the whole name.
+    """
+    for part in re.split(r'[_\-\s]+', data_name):
+        if part and not re.fullmatch(r'[\d.]+', part):
+            return part.lower()
+    return data_name
+
+
+class ResultsStore:
+    """
+    SQLite store of the minutes of interaction per hour of every processed file,
+    indexed by animal, device, date and hour, so results can be compared across
+    animals and weeks without re-processing the raw logs. Saving a file again
+    replaces its previous rows.
+    """
+    def __init__(self, path: str = DEFAULT_STORE_PATH) -> None:
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Several batch workers may append at once: wait for each other's writes
+        self.connection = sqlite3.connect(path, timeout=30)
+        self.connection.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.connection.close()
+
+    def __enter__(self) -> 'ResultsStore':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def append(self, result_with_counts: NDArray[np.int64], source: str, animal: str, device: str = '',
+               threshold: Optional[float] = None, metric: Optional[str] = None) -> None:
+        """
+        Store an enrichment table (year, month, day, hour, minutes rows) of one data file.
+        """
+        rows = [(animal, device, source, f'{year:04d}-{month:02d}-{day:02d}', int(hour), int(minutes), threshold, metric)
+                for year, month, day, hour, minutes in np.asarray(result_with_counts, dtype=np.int64).tolist()]
+        with self.connection:
+            self.connection.execute('DELETE FROM results WHERE animal = ? AND device = ? AND source = ?',
+                                    (animal, device, source))
+            self.connection.executemany('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+
+    def animals(self) -> List[str]:
+        return [animal for animal, in self.connection.execute('SELECT DISTINCT animal FROM results ORDER BY animal')]
+
+    def minutes_per_period(self, period: str = 'week', animals: Optional[List[str]] = None,
+                           start_date: Optional[str] = None, end_date: Optional[str] = None) -> List[Tuple[str, str, int]]:
+        """
+        Total minutes of interaction per animal and period ('hour', 'day', 'week' or 'month'),
+        optionally restricted to some animals and to dates (YYYY-MM-DD, inclusive).
+        Returns (animal, period, minutes) rows sorted by period.
+        """
+        if period not in PERIODS:
+            raise ValueError(f"Unknown period {period!r}, expected one of {', '.join(PERIODS)}")
+
+        conditions, parameters = [], []
+        if animals:
+            conditions.append(f"animal IN ({', '.join('?' * len(animals))})")
+            parameters.extend(animals)
+        if start_date is not None:
+            conditions.append('date >= ?')
+            parameters.append(start_date)
+        if end_date is not None:
+            conditions.append('date <= ?')
+            parameters.append(end_date)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+        query = (f'SELECT animal, {PERIODS[period]} AS period, SUM(minutes) FROM results {where} '
+                 f'GROUP BY animal, period ORDER BY period, animal')
+        return [(animal, label, int(minutes)) for animal, label, minutes in self.connection.execute(query, parameters)]
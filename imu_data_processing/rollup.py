@@ -0,0 +1,151 @@
+from typing import Callable, Dict, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from numpy.typing import NDArray
+
+from dataloader import from_epoch_seconds
+
+# Levels built up front: second, minute, hour and day (bucket widths in seconds)
+BASE_WIDTHS = (1, 60, 3600, 86400)
+
+# Number of samples scanned into seconds at a time; progress is reported (and may stop
+# the scan) after each chunk
+CHUNK_SAMPLES = 1 << 20
+
+
+class Level(NamedTuple):
+    """
+    Aggregates of the non-empty buckets of one width (seconds), in time order:
+        -  start: epoch seconds at which each bucket starts (a multiple of the width)
+        -  count: number of samples
+        -  total: sum of the activity
+        -  peak: largest activity
+        -  above: number of samples above each of the Rollups' thresholds (one column each)
+    """
+    width: int
+    start: NDArray[np.int64]
+    count: NDArray[np.int64]
+    total: NDArray[np.float64]
+    peak: NDArray[np.float64]
+    above: NDArray[np.int64]
+
+    @property
+    def mean(self) -> NDArray[np.float64]:
+        return self.total / self.count
+
+
+def _group_starts(keys: NDArray[np.int64]) -> NDArray[np.int64]:
+    # Index of the first element of every run of equal (sorted) keys
+    return np.concatenate(([0], np.flatnonzero(keys[1:] != keys[:-1]) + 1)).astype(np.int64)
+
+
+class Rollups:
+    """
+    Time rollups of a per-sample activity signal. The samples are scanned once into
+    one-second buckets; every coarser level is built from the finest level it can be
+    made of (minutes from seconds, 15 minutes from 5 minutes, days from hours...), and
+    kept, so asking for another resolution never rescans the samples. `progress`, if given,
+    is called with the fraction of the samples scanned after each chunk (it may raise to stop).
+    """
+    def __init__(self, epoch: NDArray[np.int64], activity: NDArray, thresholds: Sequence[float] = (),
+                 progress: Optional[Callable[[float], None]] = None) -> None:
+        epoch = np.asarray(epoch, dtype=np.int64)
+        activity = np.asarray(activity)
+        self.thresholds = np.asarray(thresholds, dtype=np.float64)
+
+        # Logs are written in time order, so sorting is usually skipped
+        if np.any(epoch[1:] < epoch[:-1]):
+            order = np.argsort(epoch, kind='stable')
+            epoch, activity = epoch[order], activity[order]
+
+        # Finest level: one bucket per second that has samples, scanned a chunk at a time
+        # (a second split between two chunks is merged back by combining the chunks)
+        if len(epoch):
+            chunks = []
+            for first in range(0, len(epoch), CHUNK_SAMPLES):
+                chunks.append(self._seconds(epoch[first:first + CHUNK_SAMPLES], activity[first:first + CHUNK_SAMPLES]))
+                if progress is not None:
+                    progress(min(first + CHUNK_SAMPLES, len(epoch)) / len(epoch))
+            level = chunks[0]
+            if len(chunks) > 1:
+                level = self._combine(Level(1, *(np.concatenate([getattr(chunk, name) for chunk in chunks])
+                                                 for name in Level._fields[1:])), 1)
+        else:
+            level = Level(1, np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0),
+                          np.empty(0), np.empty((0, len(self.thresholds)), dtype=np.int64))
+        self.levels: Dict[int, Level] = {1: level}
+
+        for width in BASE_WIDTHS[1:]:
+            self.level(width)
+
+    def _seconds(self, epoch: NDArray[np.int64], activity: NDArray) -> Level:
+        starts = _group_starts(epoch)
+        above = (activity[:, np.newaxis] > self.thresholds[np.newaxis, :]).astype(np.int64)
+        return Level(1, epoch[starts], np.diff(np.append(starts, len(epoch))),
+                     np.add.reduceat(activity, starts, dtype=np.float64),
+                     np.maximum.reduceat(activity, starts).astype(np.float64),
+                     np.add.reduceat(above, starts, axis=0) if len(self.thresholds) else
+                     np.zeros((len(starts), 0), dtype=np.int64))
+
+    @classmethod
+    def from_dataloader(cls, zoodata_dl, metric: str, thresholds: Sequence[float] = ()) -> 'Rollups':
+        if not zoodata_dl.has_timestamps:
+            raise ValueError("Cannot aggregate over time: the data file has no timestamps")
+        return cls(zoodata_dl.timestamps, zoodata_dl.activity(metric), thresholds)
+
+    def level(self, width: int) -> Level:
+        """
+        Aggregates per `width` seconds (e.g. 300 for 5 minutes, 86400 for a day). Buckets are
+        aligned on midnight for widths that divide a day.
+        """
+        width = int(width)
+        if width <= 0:
+            raise ValueError(f"Bucket width must be a positive number of seconds, got {width}")
+        if width not in self.levels:
+            # Build from the coarsest existing level that fits evenly into the new one
+            source = self.levels[max(w for w in self.levels if width % w == 0)]
+            self.levels[width] = self._combine(source, width)
+        return self.levels[width]
+
+    @staticmethod
+    def _combine(source: Level, width: int) -> Level:
+        keys = source.start - source.start % width
+        if not len(keys):
+            return source._replace(width=width)
+
+        starts = _group_starts(keys)
+        return Level(width, keys[starts], np.add.reduceat(source.count, starts),
+                     np.add.reduceat(source.total, starts), np.maximum.reduceat(source.peak, starts),
+                     np.add.reduceat(source.above, starts, axis=0) if source.above.shape[1] else
+                     np.zeros((len(starts), 0), dtype=np.int64))
+
+    def active(self, width: int, threshold: float, unit: int = 60,
+               statistic: str = 'peak') -> Tuple[NDArray[np.int64], NDArray[np.int64]]:
+        """
+        Number of `unit`-second buckets whose activity (`statistic`: 'peak' or 'mean') is above
+        the threshold in every `width`-second bucket (e.g. minutes of interaction per hour, or
+        with unit=1 seconds of interaction per minute). Returns the bucket starts (epoch
+        seconds) and the counts.
+        """
+        if width % unit:
+            raise ValueError(f"The bucket width ({width} s) must be a multiple of the unit ({unit} s)")
+        if statistic not in ('peak', 'mean'):
+            raise ValueError(f"Unknown statistic {statistic!r}, expected 'peak' or 'mean'")
+
+        level = self.level(width)
+        units = self.level(unit)
+        if not len(units.start):
+            return level.start, np.empty(0, dtype=np.int64)
+
+        # Every non-empty bucket holds at least one non-empty unit, so the groups line up
+        keys = units.start - units.start % width
+        values = units.peak if statistic == 'peak' else units.mean
+        counts = np.add.reduceat((values > threshold).astype(np.int64), _group_starts(keys))
+        return level.start, counts
+
+
+def interval_table(start: NDArray[np.int64], *columns: NDArray) -> NDArray[np.int64]:
+    """
+    (year, month, day, hour, minute, *columns) rows for buckets starting at the given epoch seconds.
+    """
+    return np.column_stack((from_epoch_seconds(start)[:, :5],) + columns).astype(int)